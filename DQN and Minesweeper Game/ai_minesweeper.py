@@ -1,36 +1,30 @@
 import tkinter as tk
-from random import shuffle
-import time
 import numpy as np
-from dqn_agent import DQNAgent
+from minesweeper_env import MinesweeperEnv, MINE
+from board_view import make_board
+from inference import check_board, is_artifact, load_policy
 import os
 
-class MyButton(tk.Button):
-    def __init__(self, master, number, x, y, *args, **kwargs):
-        super(MyButton, self).__init__(master, width=3, font='TimesNewRoman 15 bold',*args,**kwargs)
-        self.x = x
-        self.y = y
-        self.number = number
-        self.is_mine = False
-    def __repr__(self):
-        return f'B{self.number, self.is_mine}'
-
 class AIMinesweeper:
-    def __init__(self, agent_path='dqn_weights.pth'):
+    def __init__(self, agent_path='dqn_weights.pth', hybrid=False, rows=16, cols=16, mines=40, view=None):
+        # view: 'buttons', 'canvas' или None (выбор по размеру поля, см. board_view.make_board)
         self.window = tk.Tk()
         self.window.title("AI Minesweeper - DQN Agent")
-        self.buttons = []
-        self.ROW = 16
-        self.COLUMN = 16
-        self.MINE = 40
+        self.ROW = rows
+        self.COLUMN = cols
+        self.MINE = mines
+        self.view = view
         
         # Инициализация агента
         self.agent = None
         self.agent_path = agent_path
-        self.load_agent()
+        self.hybrid = hybrid  # ходы решателя там, где безопасная клетка выводится из чисел
+        
+        # Игра идёт в среде; поле на экране только показывает её наблюдение
+        self.env = MinesweeperEnv(self.ROW, self.COLUMN, self.MINE)
+        self.obs = self.env.reset()
         
         # Переменные игры
-        self.first_click = True
         self.game_done = False
         self.auto_play = False
         self.delay = 500  # миллисекунды между ходами
@@ -41,15 +35,24 @@ class AIMinesweeper:
         
         # Создание интерфейса
         self.create_interface()
-        self.create_buttons()
+        self.create_board()
+        
+        # Окно показываем до загрузки модели: torch импортируется только в load_agent
+        self.window.update()
+        self.load_agent()
         
     def load_agent(self):
-        """Загружает обученного агента"""
+        """Загружает обученного агента: артефакт inference.py или контрольную точку обучения"""
         try:
             if os.path.exists(self.agent_path):
                 print('Загружаю обученного агента...')
-                self.agent = DQNAgent((self.ROW, self.COLUMN), self.ROW * self.COLUMN)
-                self.agent.load(self.agent_path)
+                if is_artifact(self.agent_path):
+                    self.agent = load_policy(self.agent_path)
+                    check_board(self.agent.metadata, self.ROW, self.COLUMN)
+                else:
+                    from dqn_agent import DQNAgent
+                    self.agent = DQNAgent((self.ROW, self.COLUMN), self.ROW * self.COLUMN)
+                    self.agent.load(self.agent_path)
                 self.agent.epsilon = 0.0  # Отключаем случайность для демонстрации
                 print('Агент загружен успешно!')
                 print(f'Размер состояния: {self.ROW}x{self.COLUMN}')
@@ -79,6 +82,9 @@ class AIMinesweeper:
         self.reset_btn = tk.Button(control_frame, text="Новая игра", command=self.reset_game)
         self.reset_btn.pack(side=tk.LEFT, padx=5)
         
+        self.hybrid_var = tk.BooleanVar(value=self.hybrid)
+        tk.Checkbutton(control_frame, text="Решатель", variable=self.hybrid_var).pack(side=tk.LEFT, padx=5)
+        
         # Настройка скорости
         speed_frame = tk.Frame(control_frame)
         speed_frame.pack(side=tk.LEFT, padx=20)
@@ -92,28 +98,10 @@ class AIMinesweeper:
         self.info_label = tk.Label(control_frame, text="Готов к игре", font=('Arial', 12))
         self.info_label.pack(side=tk.RIGHT, padx=10)
         
-        # Создаем отдельный фрейм для игрового поля
-        self.game_frame = tk.Frame(self.window)
-        self.game_frame.pack(pady=10)
-        
-    def create_buttons(self):
+    def create_board(self):
         """Создает игровое поле"""
-        self.buttons = []
-        count = 1
-        for i in range(self.ROW):
-            temp = []
-            for j in range(self.COLUMN):
-                btn = MyButton(self.game_frame, x=i, y=j, number=count)
-                btn.config(command=lambda b=btn: self.click(b))
-                temp.append(btn)
-                count += 1
-            self.buttons.append(temp)
-        
-        # Размещаем кнопки
-        for i in range(self.ROW):
-            for j in range(self.COLUMN):
-                btn = self.buttons[i][j]
-                btn.grid(row=i, column=j)
+        self.board = make_board(self.view, self.window, self.ROW, self.COLUMN, self.play)
+        self.board.frame.pack(pady=10)
     
     def toggle_auto_play(self):
         """Включает/выключает автоматическую игру"""
@@ -139,32 +127,20 @@ class AIMinesweeper:
             print("Агент не загружен или игра закончена")
             return
             
-        # Получаем текущее состояние
-        state = self.get_current_state()
-        state_input = state.astype(np.float32) / 8.0
-        
-        # Выбираем действие
-        action = self.agent.select_action(state_input)
+        # Выбираем действие только среди закрытых клеток; с решателем сеть
+        # вызывается, только когда ни одна клетка не выводится как безопасная
+        by_solver = False
+        if self.hybrid_var.get():
+            action, by_solver = self.agent.select_action_hybrid(self.obs, self.MINE)
+        else:
+            state_input = self.obs.astype(np.float32) / 8.0
+            action = self.agent.select_action(state_input, self.env.legal_mask())
         x, y = divmod(action, self.COLUMN)
         
-        print(f"Агент выбирает ход: ({x}, {y})")
-        
-        # Проверяем, что клетка еще не открыта
-        if self.buttons[x][y]['state'] == 'disabled':
-            print(f"Клетка ({x}, {y}) уже открыта, выбираем другую...")
-            # Ищем закрытую клетку
-            for i in range(self.ROW):
-                for j in range(self.COLUMN):
-                    if self.buttons[i][j]['state'] != 'disabled':
-                        x, y = i, j
-                        print(f"Выбираем случайную закрытую клетку: ({x}, {y})")
-                        break
-                else:
-                    continue
-                break
+        print(f"{'Решатель' if by_solver else 'Агент'} выбирает ход: ({x}, {y})")
         
         # Выполняем ход
-        self.click(self.buttons[x][y])
+        self.play(action)
         
         # Если автоигра включена и игра не закончена, планируем следующий ход
         if self.auto_play and not self.game_done:
@@ -175,115 +151,18 @@ class AIMinesweeper:
             self.window.after(delay, self.make_ai_step)
     
     def get_current_state(self):
-        """Получает текущее состояние игры для агента"""
-        state = np.full((self.ROW, self.COLUMN), -3, dtype=int)
-        for i in range(self.ROW):
-            for j in range(self.COLUMN):
-                btn = self.buttons[i][j]
-                if btn['state'] == 'disabled':
-                    # Если кнопка открыта, берем текст (количество мин вокруг)
-                    if btn.cget('text') == '*':
-                        state[i][j] = -1  # мина
-                    else:
-                        try:
-                            state[i][j] = int(btn.cget('text'))
-                        except ValueError:
-                            state[i][j] = 0  # пустая клетка
-                else:
-                    state[i][j] = -3  # закрыто
-        return state
-    
-    def get_mine_places(self):
-        """Генерирует позиции мин"""
-        index = list(range(1, self.COLUMN * self.ROW + 1))
-        shuffle(index)
-        return index[:self.MINE]
-    
-    def insert_mine(self, safe_coords=None):
-        """Размещает мины на поле"""
-        all_indexes = [
-            (i, j)
-            for i in range(self.ROW)
-            for j in range(self.COLUMN)
-            if not safe_coords or (i, j) not in safe_coords
-        ]
-        shuffle(all_indexes)
-        mine_coords = all_indexes[:self.MINE]
-        for i, j in mine_coords:
-            self.buttons[i][j].is_mine = True
-    
-    def count_mines_around(self, btn: MyButton):
-        """Подсчитывает количество мин вокруг кнопки"""
-        count_mine = 0
-        for dx in [-1, 0, 1]:
-            for dy in [-1, 0, 1]:
-                if dx == 0 and dy == 0:
-                    continue
-                x, y = btn.x + dx, btn.y + dy
-                if 0 <= x < self.ROW and 0 <= y < self.COLUMN:
-                    neighbor = self.buttons[x][y]
-                    if neighbor.is_mine:
-                        count_mine += 1
-        return count_mine
+        """Текущее наблюдение среды для агента"""
+        return self.obs.copy()
     
-    def click(self, clicked_button: MyButton):
-        """Обрабатывает клик по кнопке"""
+    def play(self, action):
+        """Делает ход в среде (клик по клетке action) и перерисовывает только открытые им клетки"""
         if self.game_done:
             return
-            
-        if self.first_click:
-            # Определяем координаты безопасной зоны
-            safe_coords = [
-                (clicked_button.x + dx, clicked_button.y + dy)
-                for dx in [-1, 0, 1]
-                for dy in [-1, 0, 1]
-                if 0 <= clicked_button.x + dx < self.ROW and 0 <= clicked_button.y + dy < self.COLUMN
-            ]
-            self.insert_mine(safe_coords)
-            self.first_click = False
-            self.open_empty_cells(clicked_button)
-            clicked_button.config(state='disabled')
-            return
-            
-        if clicked_button.is_mine:
-            clicked_button.config(text="*", background='red', disabledforeground='black')
-            self.game_over(False)
-        else:
-            mines_around = self.count_mines_around(clicked_button)
-            clicked_button.config(text=mines_around)
-            if mines_around == 0:
-                self.open_empty_cells(clicked_button)
-        clicked_button.config(state='disabled')
-        
-        # Проверка на победу
-        self.check_win()
-    
-    def open_empty_cells(self, btn: MyButton):
-        """Открывает пустые клетки вокруг"""
-        for dx in [-1, 0, 1]:
-            for dy in [-1, 0, 1]:
-                if dx == 0 and dy == 0:
-                    continue
-                x, y = btn.x + dx, btn.y + dy
-                if 0 <= x < self.ROW and 0 <= y < self.COLUMN:
-                    neighbor = self.buttons[x][y]
-                    if neighbor['state'] == 'disabled':
-                        continue
-                    mines_around = self.count_mines_around(neighbor)
-                    neighbor.config(text=mines_around, state='disabled')
-                    if mines_around == 0:
-                        self.open_empty_cells(neighbor)
-    
-    def check_win(self):
-        """Проверяет, выиграл ли игрок"""
-        opened_count = 0
-        for row in self.buttons:
-            for btn in row:
-                if btn['state'] == 'disabled' and not btn.is_mine:
-                    opened_count += 1
-        
-        if opened_count == self.ROW * self.COLUMN - self.MINE:
-            self.game_over(True)
+        _, _, done, info = self.env.step(action, out=self.obs)
+        cells = self.env.last_revealed
+        self.board.reveal(cells, self.obs.reshape(-1)[cells])
+        if done:
+            self.game_over('win' in info)
     
     def game_over(self, won):
         """Обрабатывает окончание игры"""
@@ -294,18 +173,10 @@ class AIMinesweeper:
         if won:
             self.games_won += 1
             self.info_label.config(text=f"ПОБЕДА! 🎉 (Игр: {self.games_played}, Побед: {self.games_won})")
-            # Показываем все мины зеленым
-            for row in self.buttons:
-                for btn in row:
-                    if btn.is_mine:
-                        btn.config(text="*", background='green', disabledforeground='white')
         else:
             self.info_label.config(text=f"ПОРАЖЕНИЕ! 💥 (Игр: {self.games_played}, Побед: {self.games_won})")
-            # Показываем все мины красным
-            for row in self.buttons:
-                for btn in row:
-                    if btn.is_mine:
-                        btn.config(text="*", background='red', disabledforeground='white')
+        # Показываем все мины: зелёным при победе, красным при поражении
+        self.board.show_mines(np.flatnonzero(self.env.board == MINE), 'green' if won else 'red')
         
         # Если автоигра включена, перезапускаем игру через 2 секунды
         if self.auto_play:
@@ -325,7 +196,6 @@ class AIMinesweeper:
     def reset_game(self):
         """Сбрасывает игру"""
         self.game_done = False
-        self.first_click = True
         # Не отключаем автоигру при сбросе, если она была включена
         if not self.auto_play:
             self.auto_play_btn.config(text="Автоигра")
@@ -334,13 +204,9 @@ class AIMinesweeper:
             self.games_won = 0
         self.info_label.config(text="Готов к игре")
         
-        # Очищаем поле
-        for row in self.buttons:
-            for btn in row:
-                btn.destroy()
-        
-        # Создаем новое поле
-        self.create_buttons()
+        # Новая партия в среде; возвращаем в исходный вид только изменённые клетки
+        self.obs = self.env.reset()
+        self.board.reset()
     
     def start(self):
         """Запускает игру"""
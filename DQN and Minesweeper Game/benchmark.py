@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Бенчмарки горячих путей обучения на CPU: среда, буфер опыта, шаг обучения и выбор действий.
+
+    python benchmark.py                          # все бенчмарки
+    python benchmark.py --only env replay        # выбранные группы
+    python benchmark.py --save bench_baseline.json
+    python benchmark.py --compare bench_baseline.json
+"""
+
+import argparse
+import json
+import platform
+import random
+import tempfile
+import time
+
+import numpy as np
+import torch
+
+from minesweeper_env import MinesweeperEnv, VecMinesweeperEnv
+from bitboard_env import BitboardMinesweeperEnv
+from replay_buffer import ReplayBuffer, CompactReplayBuffer, PrioritizedReplayBuffer
+from dqn_agent import DQNAgent, model_nbytes
+
+BOARDS = {'9x9': (9, 9, 10), '16x16': (16, 16, 40), '30x16': (30, 16, 99)}
+ENV_BACKENDS = {'numpy': MinesweeperEnv, 'bitboard': BitboardMinesweeperEnv}
+
+
+def measure(fn, min_time):
+    """Вызывает fn() (возвращает число обработанных единиц), пока не пройдёт min_time секунд; даёт единиц/с."""
+    fn()  # прогрев
+    units = 0
+    start = time.perf_counter()
+    while True:
+        units += fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return units / elapsed
+
+
+def record(results, name, params, metric, value):
+    results.append({'name': name, 'params': params, 'metric': metric, 'value': float(value)})
+    print(f"  {name:<32} {params:<14} {value:>14,.1f} {metric}")
+
+
+def random_transitions(rows, cols, n_mines, count, seed=0):
+    """Переходы случайной игры (сырые наблюдения) для наполнения буферов."""
+    env = MinesweeperEnv(rows, cols, n_mines, seed=seed)
+    rng = np.random.default_rng(seed)
+    transitions = []
+    obs = env.reset()
+    while len(transitions) < count:
+        action = int(rng.choice(np.flatnonzero(env.legal_mask())))
+        next_obs, reward, done, _ = env.step(action)
+        transitions.append((obs, action, reward, next_obs, done))
+        obs = env.reset() if done else next_obs
+    return transitions
+
+
+def bench_env(results, boards, batch_sizes, min_time):
+    print("Среда:")
+    for board in boards:
+        rows, cols, n_mines = BOARDS[board]
+        for backend, env_cls in ENV_BACKENDS.items():
+            env = env_cls(rows, cols, n_mines)
+            rng = np.random.default_rng(0)
+            counts = {'steps': 0, 'revealed': 0}
+            # Имена замеров основной среды без суффикса - как в старых базовых линиях
+            suffix = '' if backend == 'numpy' else f'[{backend}]'
+
+            def play_episode():
+                env.reset()
+                done = False
+                steps = 0
+                while not done:
+                    action = int(rng.choice(np.flatnonzero(env.legal_mask())))
+                    opened = env.opened
+                    _, _, done, info = env.step(action)
+                    counts['revealed'] += env.opened - opened + ('lose' in info)
+                    steps += 1
+                counts['steps'] += steps
+                return steps
+
+            steps_rate = measure(play_episode, min_time)
+            record(results, f'env.step{suffix}', board, 'steps/sec', steps_rate)
+            # Открытых клеток в секунду: скорость ходов, умноженная на среднее число клеток за ход
+            record(results, f'env.reveal{suffix}', board, 'reveals/sec',
+                   steps_rate * counts['revealed'] / counts['steps'])
+
+            def reset_and_place():
+                env.reset()
+                env.step(int(rng.integers(env.action_space)))
+                return 1
+
+            record(results, f'env.reset+place_mines{suffix}', board, 'resets/sec', measure(reset_and_place, min_time))
+
+        for n in batch_sizes:
+            vec = VecMinesweeperEnv(n, rows, cols, n_mines, seed=0)
+
+            def vec_step():
+                scores = vec.rng.random((n, vec.action_space))
+                scores[~vec.legal_mask()] = -1.0
+                vec.step(scores.argmax(1))
+                return n
+
+            record(results, 'vec_env.step', f'{board} N={n}', 'steps/sec', measure(vec_step, min_time))
+
+
+def bench_replay(results, boards, batch_sizes, min_time, capacity=20000):
+    print("Буфер опыта:")
+    storage = tempfile.TemporaryDirectory()
+    for board in boards:
+        rows, cols, n_mines = BOARDS[board]
+        transitions = random_transitions(rows, cols, n_mines, 2000)
+        kinds = {
+            'plain': lambda: ReplayBuffer(capacity),
+            'compact': lambda: CompactReplayBuffer(capacity),
+            'compact+per': lambda: PrioritizedReplayBuffer(CompactReplayBuffer(capacity)),
+            'compact+nstep3': lambda: CompactReplayBuffer(capacity, n_step=3),
+            'compact+mmap': lambda: CompactReplayBuffer(capacity, storage_dir=tempfile.mkdtemp(dir=storage.name)),
+        }
+        for kind, make in kinds.items():
+            buffer = make()
+            # Обычный буфер хранит нормализованные наблюдения
+            if kind == 'plain':
+                items = [(o / 8.0, a, r, n / 8.0, d) for o, a, r, n, d in transitions]
+            else:
+                items = transitions
+
+            def store_all():
+                for item in items:
+                    buffer.store(*item)
+                return len(items)
+
+            record(results, f'replay.store[{kind}]', board, 'stores/sec', measure(store_all, min_time))
+            while len(buffer) < capacity // 2:
+                store_all()
+            record(results, f'replay.memory[{kind}]', board, 'bytes/transition', buffer.nbytes / capacity)
+            for batch_size in batch_sizes:
+                def sample():
+                    buffer.sample(batch_size)
+                    return batch_size
+
+                record(results, f'replay.sample[{kind}]', f'{board} B={batch_size}', 'samples/sec',
+                       measure(sample, min_time))
+    storage.cleanup()
+
+
+def bench_learner(results, boards, batch_sizes, min_time, archs=('dense', 'conv')):
+    print("Шаг обучения:")
+    for board in boards:
+        rows, cols, n_mines = BOARDS[board]
+        transitions = random_transitions(rows, cols, n_mines, 1000)
+        for arch in archs:
+            for batch_size in batch_sizes:
+                agent = DQNAgent((rows, cols), rows * cols, batch_size=batch_size, compact_replay=True,
+                                 arch=arch, device='cpu')
+                for item in transitions:
+                    agent.store(*item)
+
+                def update():
+                    agent.update()
+                    return 1
+
+                record(results, f'agent.update[{arch}]', f'{board} B={batch_size}', 'updates/sec',
+                       measure(update, min_time))
+
+
+def bench_inference(results, boards, batch_sizes, min_time, archs=('dense', 'conv')):
+    print("Выбор действий:")
+    for board in boards:
+        rows, cols, n_mines = BOARDS[board]
+        obs = np.array([t[0] for t in random_transitions(rows, cols, n_mines, max(batch_sizes))])
+        states = obs.astype(np.float32) / 8.0
+        masks = obs.reshape(len(obs), -1) == -3
+        for arch in archs:
+            agent = DQNAgent((rows, cols), rows * cols, buffer_size=1, arch=arch, device='cpu')
+            agent.epsilon = 0.0
+
+            def single():
+                agent.select_action(states[0], masks[0])
+                return 1
+
+            # Сначала float-сеть, затем та же с квантованием int8 (DQNAgent.quantize)
+            rates = {}
+            for mode in ('', '+int8'):
+                if mode:
+                    agreement = agent.quantize(states, masks)
+                name = f'{arch}{mode}'
+                rates[mode] = measure(single, min_time)
+                record(results, f'agent.select_action[{name}]', board, 'inferences/sec', rates[mode])
+                for n in batch_sizes:
+                    record(results, f'agent.select_actions[{name}]', f'{board} N={n}', 'inferences/sec',
+                           measure(lambda: len(agent.select_actions(states[:n], masks[:n])), min_time))
+                record(results, f'agent.model[{name}]', board, 'bytes/model',
+                       model_nbytes(agent.quantized_network if mode else agent.q_network))
+            record(results, f'agent.int8_speedup[{arch}]', board, 'x', rates['+int8'] / rates[''])
+            record(results, f'agent.int8_memory[{arch}]', board, 'x smaller',
+                   model_nbytes(agent.q_network) / model_nbytes(agent.quantized_network))
+            record(results, f'agent.int8_agreement[{arch}]', board, '% greedy match', 100 * agreement)
+
+
+GROUPS = {
+    'env': (bench_env, [16, 256]),
+    'replay': (bench_replay, [64, 256]),
+    'learner': (bench_learner, [32, 64]),
+    'inference': (bench_inference, [64, 256]),
+}
+
+
+def compare(results, baseline_path, tolerance):
+    """Печатает изменение относительно сохранённых результатов; возвращает число просадок."""
+    with open(baseline_path) as f:
+        baseline = {(r['name'], r['params'], r['metric']): r['value'] for r in json.load(f)['results']}
+    print(f"\nСравнение с {baseline_path} (допуск {tolerance:.0%}):")
+    regressions = 0
+    for r in results:
+        old = baseline.get((r['name'], r['params'], r['metric']))
+        if old is None or old == 0:
+            continue
+        # Для памяти меньше - лучше, для скоростей - больше
+        change = r['value'] / old - 1.0
+        worse = change > tolerance if r['metric'].startswith('bytes/') else change < -tolerance
+        regressions += worse
+        mark = '  <-- просадка' if worse else ''
+        print(f"  {r['name']:<32} {r['params']:<14} {old:>14,.1f} -> {r['value']:>14,.1f} ({change:+.1%}){mark}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарки горячих путей обучения (только CPU)')
+    parser.add_argument('--only', nargs='+', choices=list(GROUPS), default=list(GROUPS),
+                        help='какие группы бенчмарков запускать')
+    parser.add_argument('--boards', nargs='+', choices=list(BOARDS), default=list(BOARDS),
+                        help='размеры полей')
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=None,
+                        help='размеры батчей (по умолчанию свои для каждой группы)')
+    parser.add_argument('--min-time', type=float, default=1.0, help='секунд на один замер')
+    parser.add_argument('--threads', type=int, default=None, help='потоков torch (по умолчанию как есть)')
+    parser.add_argument('--save', help='сохранить результаты в JSON как базовую линию')
+    parser.add_argument('--compare', help='сравнить с базовой линией из JSON')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='допустимое отклонение при сравнении')
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    random.seed(0)
+    np.random.seed(0)
+    torch.manual_seed(0)
+
+    results = []
+    for group in args.only:
+        fn, default_batches = GROUPS[group]
+        fn(results, args.boards, args.batch_sizes or default_batches, args.min_time)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({
+                'machine': platform.platform(),
+                'python': platform.python_version(),
+                'torch': torch.__version__,
+                'threads': torch.get_num_threads(),
+                'results': results,
+            }, f, indent=2, ensure_ascii=False)
+        print(f"\nРезультаты сохранены в {args.save}")
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        if regressions:
+            raise SystemExit(f"Просадок: {regressions}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+import numpy as np
+
+from minesweeper_env import CLOSED, MINE, _NO_CELLS
+
+
+class BitboardMinesweeperEnv:
+    """
+    Та же среда, что MinesweeperEnv, но мины, открытые и пустые клетки хранятся битовыми
+    масками в целых числах Python: клетка (x, y) - бит x * (cols + 1) + y. Лишний столбец
+    в каждой строке всегда пуст и служит разделителем, так что сдвиг маски на 1 влево или
+    вправо не переносит биты через край поля. Числа вокруг мин - сумма восьми сдвигов
+    маски мин побитовыми сумматорами, раскрытие пустой области - наращивание маски
+    сдвигами. При одинаковом зерне и ходах партия совпадает с MinesweeperEnv.
+    """
+    def __init__(self, rows=16, cols=16, n_mines=40, readonly_obs=False, max_steps=None, seed=None):
+        self.rows = rows
+        self.cols = cols
+        self.n_mines = n_mines
+        self.action_space = rows * cols
+        self.observation_space = (rows, cols)
+        self.seed(seed)
+        self.readonly_obs = readonly_obs
+        self.max_steps = max_steps
+        self._width = cols + 1
+        row_bits = (1 << cols) - 1
+        self._full = sum(row_bits << (x * self._width) for x in range(rows))
+        self._nbytes = (rows * self._width + 7) // 8
+        self._obs = np.full((rows, cols), CLOSED, dtype=int)
+        self._obs_view = self._obs.view()
+        self._obs_view.flags.writeable = False
+        self.reset()
+
+    def seed(self, seed=None):
+        """Пересоздаёт ГСЧ среды; seed=None - случайное зерно."""
+        self.np_random = np.random.default_rng(seed)
+
+    def reset(self, out=None, seed=None):
+        if seed is not None:
+            self.seed(seed)
+        self.mines_bits = 0
+        self.visible_bits = 0
+        self.zero_bits = 0
+        self.done = False
+        self.first_move = True
+        self.opened = 0
+        self.steps = 0
+        self.last_revealed = _NO_CELLS
+        self._counts = None
+        self._obs.fill(CLOSED)
+        return self._get_obs(out)
+
+    def _bit(self, x, y):
+        return 1 << (x * self._width + y)
+
+    def _to_array(self, bits):
+        """Маска -> bool-массив (rows, cols)."""
+        raw = np.unpackbits(np.frombuffer(bits.to_bytes(self._nbytes, 'little'), dtype=np.uint8),
+                            bitorder='little')
+        return raw[:self.rows * self._width].reshape(self.rows, self._width)[:, :self.cols].astype(bool)
+
+    def _from_array(self, mask):
+        padded = np.zeros((self.rows, self._width), dtype=bool)
+        padded[:, :self.cols] = mask
+        return int.from_bytes(np.packbits(padded.reshape(-1), bitorder='little').tobytes(), 'little')
+
+    def _shifts(self, bits):
+        # Восемь сдвигов маски к соседям; биты, ушедшие в столбец-разделитель или за поле, срезаются
+        w = self._width
+        full = self._full
+        return [(bits << s) & full for s in (1, w - 1, w, w + 1)] + \
+               [(bits >> s) & full for s in (1, w - 1, w, w + 1)]
+
+    def _dilate(self, bits):
+        out = bits
+        for shifted in self._shifts(bits):
+            out |= shifted
+        return out
+
+    def _neighbour_planes(self, bits):
+        """Число соседей из bits для каждой клетки как четыре битовые плоскости (0-8)."""
+        planes = [0, 0, 0, 0]
+        for carry in self._shifts(bits):
+            for k in range(4):
+                planes[k], carry = planes[k] ^ carry, planes[k] & carry
+                if not carry:
+                    break
+        return planes
+
+    def _place_mines(self, safe_coords):
+        # Тот же выбор ГСЧ, что в MinesweeperEnv._place_mines, - мины совпадают при одинаковом зерне
+        safe = np.zeros((self.rows, self.cols), dtype=bool)
+        safe_idx = np.array(safe_coords, dtype=int).reshape(-1, 2)
+        safe[safe_idx[:, 0], safe_idx[:, 1]] = True
+        picks = self.np_random.choice(np.flatnonzero(~safe), self.n_mines, replace=False)
+        mines = np.zeros(self.rows * self.cols, dtype=bool)
+        mines[picks] = True
+        self.mines_bits = self._from_array(mines.reshape(self.rows, self.cols))
+        planes = self._neighbour_planes(self.mines_bits)
+        # Пустые клетки: не мины, у которых все плоскости счётчика нулевые
+        self.zero_bits = self._full & ~self.mines_bits & ~(planes[0] | planes[1] | planes[2] | planes[3])
+        # Числа нужны только для наблюдения: разворачиваем плоскости в массив один раз за партию
+        counts = sum(self._to_array(p).astype(int) << k for k, p in enumerate(planes))
+        self._counts = np.where(self._to_array(self.mines_bits), MINE, counts)
+
+    @property
+    def board(self):
+        """Поле как в MinesweeperEnv: -1 - мина, 0-8 - число мин вокруг."""
+        if self._counts is None:
+            return np.zeros((self.rows, self.cols), dtype=int)
+        return self._counts.copy()
+
+    @property
+    def visible(self):
+        return self._to_array(self.visible_bits).astype(int)
+
+    def step(self, action, out=None):
+        """
+        action: int (от 0 до rows*cols-1) или (x, y)
+        out: необязательный массив (rows, cols), куда записывается наблюдение
+        Возвращает: obs, reward, done, info
+        """
+        if isinstance(action, (int, np.integer)):
+            x, y = divmod(int(action), self.cols)
+        else:
+            x, y = action
+        self.last_revealed = _NO_CELLS
+        if self.done:
+            return self._get_obs(out), 0.0, self.done, {}
+        reward, info = self._play(x, y)
+        self.steps += 1
+        if not self.done and self.max_steps is not None and self.steps >= self.max_steps:
+            self.done = True
+            info["truncated"] = True
+        return self._get_obs(out), reward, self.done, info
+
+    def _play(self, x, y):
+        bit = self._bit(x, y)
+        if self.visible_bits & bit:
+            return 0.0, {}
+        if self.first_move:
+            safe = [(x + dx, y + dy) for dx in [-1, 0, 1] for dy in [-1, 0, 1]
+                    if 0 <= x + dx < self.rows and 0 <= y + dy < self.cols]
+            self._place_mines(safe)
+            self.first_move = False
+        if self.mines_bits & bit:
+            self.visible_bits |= bit
+            self._obs[x, y] = MINE
+            self.last_revealed = np.array([x * self.cols + y])
+            self.done = True
+            return -10.0, {"lose": True}
+        opened_now = self._open_cell(bit)
+        self.opened += opened_now
+        if self.opened == self.rows * self.cols - self.n_mines:
+            self.done = True
+            return 10.0, {"win": True}
+        return 0.1 * opened_now, {}
+
+    def _open_cell(self, bit):
+        # Числовая клетка открывается одна, пустая - вся её область вместе с числами по краю
+        region = bit
+        if self.zero_bits & bit:
+            while True:
+                grown = region | (self._dilate(region) & self.zero_bits)
+                if grown == region:
+                    break
+                region = grown
+            region = self._dilate(region)
+        new = region & ~self.visible_bits
+        self.visible_bits |= region
+        cells = self._to_array(new)
+        self._obs[cells] = self._counts[cells]
+        self.last_revealed = np.flatnonzero(cells)
+        return len(self.last_revealed)
+
+    def legal_mask(self):
+        """Маска допустимых действий (rows*cols,): True для ещё закрытых клеток."""
+        return ~self._to_array(self.visible_bits).reshape(-1)
+
+    def _get_obs(self, out=None):
+        if out is not None:
+            np.copyto(out, self._obs)
+            return out
+        if self.readonly_obs:
+            return self._obs_view
+        return self._obs.copy()
+
+    def render(self):
+        visible = self._to_array(self.visible_bits)
+        for i in range(self.rows):
+            row = ''
+            for j in range(self.cols):
+                if visible[i, j]:
+                    row += '* ' if self._counts[i, j] == MINE else f'{self._counts[i, j]} '
+                else:
+                    row += '# '
+            print(row)
+        print()
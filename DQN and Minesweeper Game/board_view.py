@@ -0,0 +1,144 @@
+import tkinter as tk
+
+from minesweeper_env import MINE
+
+# Цвета цифр как в классическом сапёре
+NUMBER_COLORS = {1: 'blue', 2: 'green', 3: 'red', 4: 'navy', 5: 'maroon', 6: 'teal', 7: 'black', 8: 'gray30'}
+CLOSED_COLOR = 'gray75'
+OPEN_COLOR = 'gray92'
+
+
+class ButtonBoard:
+    """
+    Поле из кнопок tk.Button (по одной на клетку). Удобно на небольших полях;
+    on_click(action) получает плоский индекс клетки.
+    """
+    def __init__(self, master, rows, cols, on_click):
+        self.rows = rows
+        self.cols = cols
+        self.frame = tk.Frame(master)
+        self.buttons = []
+        for i in range(rows):
+            for j in range(cols):
+                btn = tk.Button(self.frame, width=3, font='TimesNewRoman 15 bold',
+                                command=lambda a=i * cols + j: on_click(a))
+                btn.grid(row=i, column=j)
+                self.buttons.append(btn)
+        self.default_background = self.buttons[0].cget('background')
+        self.dirty = set()  # клетки, изменённые с последнего reset()
+
+    def reveal(self, cells, values):
+        """Открывает клетки cells (плоские индексы) со значениями из наблюдения."""
+        for cell, value in zip(cells, values):
+            cell = int(cell)
+            if value == MINE:
+                self.buttons[cell].config(text="*", background='red', disabledforeground='black', state='disabled')
+            else:
+                self.buttons[cell].config(text=int(value), state='disabled')
+            self.dirty.add(cell)
+
+    def show_mines(self, cells, background, foreground='white'):
+        for cell in cells:
+            cell = int(cell)
+            self.buttons[cell].config(text="*", background=background, disabledforeground=foreground,
+                                      state='disabled')
+            self.dirty.add(cell)
+
+    def reset(self):
+        """Возвращает в исходный вид только изменённые клетки."""
+        for cell in self.dirty:
+            self.buttons[cell].config(text='', state='normal', background=self.default_background)
+        self.dirty.clear()
+
+
+class CanvasBoard:
+    """
+    Поле на одном tk.Canvas: по прямоугольнику на клетку, текст создаётся при первом
+    открытии клетки и дальше только перенастраивается. Изменения хода применяются к
+    своим элементам холста, а Tk перерисовывает их разом, так что поля 100x100
+    открываются и обновляются без задержек. Размер клетки подбирается под max_view;
+    если поле всё равно не помещается, появляются полосы прокрутки.
+    """
+    def __init__(self, master, rows, cols, on_click, cell_size=None, max_view=(960, 720)):
+        self.rows = rows
+        self.cols = cols
+        self.on_click = on_click
+        if cell_size is None:
+            cell_size = max(12, min(32, max_view[0] // cols, max_view[1] // rows))
+        self.cell = cell_size
+        width, height = cols * cell_size, rows * cell_size
+        self.frame = tk.Frame(master)
+        self.canvas = tk.Canvas(self.frame, width=min(width, max_view[0]), height=min(height, max_view[1]),
+                                scrollregion=(0, 0, width, height), highlightthickness=0, background=CLOSED_COLOR)
+        self.canvas.grid(row=0, column=0)
+        if width > max_view[0]:
+            xbar = tk.Scrollbar(self.frame, orient='horizontal', command=self.canvas.xview)
+            xbar.grid(row=1, column=0, sticky='ew')
+            self.canvas.config(xscrollcommand=xbar.set)
+        if height > max_view[1]:
+            ybar = tk.Scrollbar(self.frame, orient='vertical', command=self.canvas.yview)
+            ybar.grid(row=0, column=1, sticky='ns')
+            self.canvas.config(yscrollcommand=ybar.set)
+        self.font = ('Arial', max(6, cell_size // 2), 'bold')
+        self.rects = [
+            self.canvas.create_rectangle(j * cell_size, i * cell_size, (j + 1) * cell_size, (i + 1) * cell_size,
+                                         fill=CLOSED_COLOR, outline='gray55')
+            for i in range(rows) for j in range(cols)
+        ]
+        self.texts = {}   # клетка -> текстовый элемент холста
+        self.dirty = set()
+        self.canvas.bind('<Button-1>', self._click)
+
+    def _click(self, event):
+        x = int(self.canvas.canvasy(event.y) // self.cell)
+        y = int(self.canvas.canvasx(event.x) // self.cell)
+        if 0 <= x < self.rows and 0 <= y < self.cols:
+            self.on_click(x * self.cols + y)
+
+    def _set_text(self, cell, text, color):
+        item = self.texts.get(cell)
+        if item is None:
+            if not text:
+                return
+            x, y = divmod(cell, self.cols)
+            self.texts[cell] = self.canvas.create_text((y + 0.5) * self.cell, (x + 0.5) * self.cell,
+                                                       text=text, fill=color, font=self.font)
+        else:
+            self.canvas.itemconfigure(item, text=text, fill=color)
+
+    def reveal(self, cells, values):
+        """Открывает клетки cells (плоские индексы) со значениями из наблюдения."""
+        for cell, value in zip(cells, values):
+            cell = int(cell)
+            if value == MINE:
+                self.canvas.itemconfigure(self.rects[cell], fill='red')
+                self._set_text(cell, '*', 'black')
+            else:
+                self.canvas.itemconfigure(self.rects[cell], fill=OPEN_COLOR)
+                self._set_text(cell, str(value) if value > 0 else '', NUMBER_COLORS.get(int(value), 'black'))
+            self.dirty.add(cell)
+
+    def show_mines(self, cells, background, foreground='white'):
+        for cell in cells:
+            cell = int(cell)
+            self.canvas.itemconfigure(self.rects[cell], fill=background)
+            self._set_text(cell, '*', foreground)
+            self.dirty.add(cell)
+
+    def reset(self):
+        """Возвращает в исходный вид только изменённые клетки."""
+        for cell in self.dirty:
+            self.canvas.itemconfigure(self.rects[cell], fill=CLOSED_COLOR)
+            if cell in self.texts:
+                self.canvas.itemconfigure(self.texts[cell], text='')
+        self.dirty.clear()
+
+
+VIEWS = {'buttons': ButtonBoard, 'canvas': CanvasBoard}
+
+
+def make_board(view, master, rows, cols, on_click):
+    """view: 'buttons', 'canvas' или None - кнопки до 30x30 клеток, холст на полях больше."""
+    if view is None:
+        view = 'buttons' if rows * cols <= 900 else 'canvas'
+    return VIEWS[view](master, rows, cols, on_click)
@@ -0,0 +1,126 @@
+import os
+import queue
+import re
+import threading
+
+import numpy as np
+import torch
+
+
+def to_cpu(obj):
+    """
+    Копия вложенной структуры для записи: тензоры копируются на CPU, массивы NumPy
+    становятся тензорами без копирования - state_dict буфера и генераторов уже отдают
+    собственные копии. Результат не зависит от дальнейшего обучения и читается
+    через torch.load(weights_only=True).
+    """
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().to('cpu', copy=True)
+    if isinstance(obj, np.ndarray):
+        return torch.from_numpy(obj)
+    if isinstance(obj, dict):
+        return {k: to_cpu(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(to_cpu(v) for v in obj)
+    return obj
+
+
+def to_numpy(obj):
+    """Обратное к to_cpu для состояний, которые хранились в NumPy (буфер опыта, ГСЧ)."""
+    if isinstance(obj, torch.Tensor):
+        return obj.cpu().numpy()
+    if isinstance(obj, dict):
+        return {k: to_numpy(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(to_numpy(v) for v in obj)
+    return obj
+
+
+def atomic_save(obj, path):
+    """torch.save во временный файл рядом с path и os.replace: файл по path всегда целый."""
+    tmp = f'{path}.tmp'
+    with open(tmp, 'wb') as f:
+        torch.save(obj, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class CheckpointWriter:
+    """
+    Запись контрольных точек в фоновом потоке. save() принимает уже снятый снимок
+    состояния (to_cpu / DQNAgent.checkpoint_state), так что обучение продолжается,
+    пока поток пишет файл. Каждая точка пишется атомарно в path с номером
+    (dqn_weights_0000500.pth), затем path обновляется на неё; хранятся keep_last
+    последних пронумерованных файлов. Пока предыдущая точка не записана, save() ждёт.
+    """
+    def __init__(self, path, keep_last=3):
+        self.path = path
+        self.keep_last = keep_last
+        root, ext = os.path.splitext(path)
+        self._template = root + '_{:07d}' + ext
+        self._pattern = re.compile(re.escape(os.path.basename(root)) + r'_(\d+)' + re.escape(ext) + '$')
+        self._queue = queue.Queue(maxsize=1)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name='checkpoint-writer', daemon=True)
+        self._thread.start()
+
+    def save(self, state, step):
+        self._raise_error()
+        self._queue.put((state, step))
+
+    def wait(self):
+        """Ждёт, пока все переданные точки будут записаны."""
+        self._queue.join()
+        self._raise_error()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        self._raise_error()
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError('не удалось записать контрольную точку') from error
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                self._write(*item)
+            except Exception as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _write(self, state, step):
+        numbered = self._template.format(step)
+        atomic_save(state, numbered)
+        # path - копия последней точки; жёсткая ссылка не требует второй записи
+        tmp = f'{self.path}.tmp'
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        try:
+            os.link(numbered, tmp)
+            os.replace(tmp, self.path)
+        except OSError:
+            atomic_save(state, self.path)
+        self._prune()
+
+    def checkpoints(self):
+        """Пронумерованные точки от старых к новым."""
+        directory = os.path.dirname(self.path) or '.'
+        found = []
+        for name in os.listdir(directory):
+            match = self._pattern.match(name)
+            if match:
+                found.append((int(match.group(1)), os.path.join(directory, name)))
+        return [path for _, path in sorted(found)]
+
+    def _prune(self):
+        if self.keep_last > 0:
+            for path in self.checkpoints()[:-self.keep_last]:
+                os.remove(path)
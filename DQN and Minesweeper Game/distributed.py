@@ -0,0 +1,242 @@
+import random
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+
+from minesweeper_env import MinesweeperEnv
+from dqn_agent import NETWORKS
+from metrics import PhaseTimer
+
+# Поля заголовка очереди в общей памяти
+_WRITE, _READ, _STEPS, _EPISODES, _WINS = range(5)
+_HEADER_SIZE = 8
+
+
+class TransitionQueue:
+    """
+    Кольцевая очередь переходов одного актора в общей памяти: один писатель (актор),
+    один читатель (learner). Наблюдения хранятся сырыми кодами клеток в int8.
+    Счётчики записи/чтения и статистика актора лежат в заголовке того же блока;
+    читатель видит переход только после того, как писатель сдвинул счётчик записи.
+    """
+    def __init__(self, slots, state_shape, name=None):
+        self.slots = slots
+        self.state_shape = tuple(state_shape)
+        fields = [
+            ('header', np.int64, (_HEADER_SIZE,)),
+            ('obs', np.int8, (slots, *self.state_shape)),
+            ('next_obs', np.int8, (slots, *self.state_shape)),
+            ('actions', np.int64, (slots,)),
+            ('rewards', np.float32, (slots,)),
+            ('dones', np.float32, (slots,)),
+        ]
+        size = sum(np.dtype(dtype).itemsize * int(np.prod(shape)) for _, dtype, shape in fields)
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        offset = 0
+        for field, dtype, shape in fields:
+            array = np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=offset)
+            setattr(self, field, array)
+            offset += array.nbytes
+        if name is None:
+            self.header[:] = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def put(self, obs, action, reward, next_obs, done, stop=None):
+        """Записывает переход; пока очередь полна, ждёт читателя. Возвращает False, если пришёл stop."""
+        write = self.header[_WRITE]
+        while write - self.header[_READ] >= self.slots:
+            if stop is not None and stop.is_set():
+                return False
+            time.sleep(0.001)
+        i = write % self.slots
+        self.obs[i] = obs
+        self.next_obs[i] = next_obs
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.dones[i] = done
+        self.header[_WRITE] = write + 1
+        return True
+
+    def drain(self, store):
+        """Передаёт все накопленные переходы в store(...) по порядку; возвращает их число."""
+        read = self.header[_READ]
+        write = self.header[_WRITE]
+        for n in range(read, write):
+            i = n % self.slots
+            store(self.obs[i], self.actions[i], self.rewards[i], self.next_obs[i], bool(self.dones[i]))
+        self.header[_READ] = write
+        return write - read
+
+    def stats(self):
+        return int(self.header[_STEPS]), int(self.header[_EPISODES]), int(self.header[_WINS])
+
+    def close(self, unlink=False):
+        # Представления на буфер должны исчезнуть до закрытия блока
+        for field in ('header', 'obs', 'next_obs', 'actions', 'rewards', 'dones'):
+            setattr(self, field, None)
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+def _actor(queue_name, queue_slots, env_kwargs, arch, shared_net, weights_version,
+           weights_lock, epsilon, budget, stop, seed):
+    """
+    Процесс-актор: играет в своей среде копией сети и пишет переходы в свою очередь.
+    Перед каждой партией берёт один эпизод из общего счётчика budget; когда он исчерпан, завершается.
+    """
+    torch.set_num_threads(1)
+    random.seed(seed)
+    env = MinesweeperEnv(**env_kwargs, seed=seed)
+    queue = TransitionQueue(queue_slots, env.observation_space, name=queue_name)
+    net = NETWORKS[arch](env.observation_space, env.action_space)
+    net.eval()
+    version = -1
+    obs = np.empty(env.observation_space, dtype=np.int8)
+    next_obs = np.empty(env.observation_space, dtype=np.int8)
+    state_input = torch.empty(env.observation_space, dtype=torch.float32)
+    try:
+        while not stop.is_set():
+            # Обновляем копию сети, если learner опубликовал новые веса
+            if weights_version.value != version:
+                with weights_lock:
+                    version = weights_version.value
+                    net.load_state_dict(shared_net.state_dict())
+            with budget.get_lock():
+                if budget.value <= 0:
+                    return
+                budget.value -= 1
+            env.reset(out=obs)
+            done = False
+            info = {}
+            while not done:
+                mask = env.legal_mask()
+                if random.random() < epsilon.value:
+                    action = int(random.choice(np.flatnonzero(mask)))
+                else:
+                    np.multiply(obs, 1 / 8.0, out=state_input.numpy())  # нормализация
+                    with torch.no_grad():
+                        q_values = net(state_input.unsqueeze(0))[0]
+                    q_values[~torch.from_numpy(mask)] = float('-inf')
+                    action = int(torch.argmax(q_values))
+                _, reward, done, info = env.step(action, out=next_obs)
+                if not queue.put(obs, action, reward, next_obs, done and not info.get('truncated', False), stop):
+                    return
+                queue.header[_STEPS] += 1
+                obs, next_obs = next_obs, obs
+            queue.header[_EPISODES] += 1
+            queue.header[_WINS] += 'win' in info
+    finally:
+        queue.close()
+
+
+def train_distributed(agent, n_actors, episodes, env_kwargs=None, queue_slots=4096,
+                      sync_every=200, report_every=10.0, save_every=500, save_checkpoint=None, seed=0,
+                      logger=None, log_every=10):
+    """
+    Обучение в режиме акторы/learner: n_actors процессов играют каждый в своей среде
+    копией Q-сети и передают переходы через общую память; текущий процесс - learner -
+    владеет буфером опыта и оптимизатором agent, делает update() без остановок и раз
+    в sync_every шагов публикует веса. Акторы вместе играют ровно episodes эпизодов, и все
+    их переходы попадают в буфер опыта.
+    Агент должен быть создан с compact_replay=True: акторы передают сырые наблюдения.
+    save_checkpoint() вызывается каждые save_every эпизодов.
+    logger: MetricsLogger, куда каждые log_every эпизодов пишется запись в формате train_dqn.train.
+    """
+    from train_dqn import log_metrics
+    env_kwargs = dict(env_kwargs or {})
+    probe = MinesweeperEnv(**env_kwargs)
+    ctx = mp.get_context('spawn')
+    shared_net = NETWORKS[agent.arch](probe.observation_space, probe.action_space)
+    shared_net.load_state_dict(agent.q_network.state_dict())
+    shared_net.share_memory()
+    weights_version = ctx.Value('l', 0)
+    weights_lock = ctx.Lock()
+    epsilon = ctx.Value('d', agent.epsilon)
+    budget = ctx.Value('l', episodes)
+    stop = ctx.Event()
+
+    queues = [TransitionQueue(queue_slots, probe.observation_space) for _ in range(n_actors)]
+    actors = [
+        ctx.Process(target=_actor, daemon=True,
+                    args=(queues[i].name, queue_slots, env_kwargs, agent.arch, shared_net, weights_version,
+                          weights_lock, epsilon, budget, stop, seed + i))
+        for i in range(n_actors)
+    ]
+    for actor in actors:
+        actor.start()
+
+    start = last_report = time.time()
+    last_steps = [0] * n_actors
+    last_updates = synced = agent.learn_step
+    last_saved = last_logged = 0
+    timer = PhaseTimer(enabled=logger is not None)
+    if logger:
+        agent.timer = timer
+    interval = {'time': start, 'env_steps': 0, 'updates': agent.learn_step, 'episodes': 0, 'wins': 0, 'steps': 0}
+    logged = (0, 0, 0)  # шагов, эпизодов и побед акторов на момент прошлой записи журнала
+    try:
+        while True:
+            timer.mark()
+            for queue in queues:
+                queue.drain(agent.store)
+            timer.lap('store')
+            agent.update()
+            epsilon.value = agent.epsilon
+            if agent.learn_step - synced >= sync_every:
+                synced = agent.learn_step
+                with weights_lock:
+                    shared_net.load_state_dict(agent.q_network.state_dict())
+                    weights_version.value += 1
+
+            stats = [queue.stats() for queue in queues]
+            total_steps = sum(s[0] for s in stats)
+            total_episodes = sum(s[1] for s in stats)
+            total_wins = sum(s[2] for s in stats)
+            if save_checkpoint and total_episodes // save_every > last_saved:
+                last_saved = total_episodes // save_every
+                timer.mark()
+                save_checkpoint()
+                timer.lap('checkpoint')
+                print(f"Контрольная точка {agent.learn_step} передана на запись")
+            if logger and total_episodes // log_every > last_logged:
+                last_logged = total_episodes // log_every
+                # Шаги интервала включают и начатые, но не доигранные партии акторов
+                interval.update(steps=total_steps - logged[0], episodes=total_episodes - logged[1],
+                                wins=total_wins - logged[2])
+                log_metrics(logger, agent, timer, interval, total_episodes, total_steps, start)
+                logged = (total_steps, total_episodes, total_wins)
+
+            now = time.time()
+            if now - last_report >= report_every or total_episodes >= episodes:
+                elapsed = now - last_report
+                rates = [(s[0] - prev) / elapsed for s, prev in zip(stats, last_steps)]
+                print(f"[{now - start:.0f}с] эпизодов {total_episodes}, побед {total_wins}, "
+                      f"буфер {len(agent.memory)}, epsilon {agent.epsilon:.3f}")
+                print("  акторы, шагов/с: " + ", ".join(f"{r:.0f}" for r in rates)
+                      + f" (всего {sum(rates):.0f})")
+                print(f"  learner: {(agent.learn_step - last_updates) / elapsed:.1f} обновлений/с")
+                last_report = now
+                last_steps = [s[0] for s in stats]
+                last_updates = agent.learn_step
+            if total_episodes >= episodes:
+                break
+    finally:
+        stop.set()
+        for actor in actors:
+            actor.join(timeout=5)
+            if actor.is_alive():
+                actor.terminate()
+        # Переходы, записанные акторами после последнего опустошения очередей
+        for queue in queues:
+            queue.drain(agent.store)
+            queue.close(unlink=True)
@@ -1,9 +1,17 @@
+import copy
+import io
 import torch
 import torch.nn as nn
 import torch.optim as optim
 import numpy as np
 import random
-from collections import deque
+from replay_buffer import ReplayBuffer, CompactReplayBuffer, PrioritizedReplayBuffer
+from minesweeper_env import CLOSED
+from checkpoint import atomic_save, to_cpu, to_numpy
+from solver import hybrid_action
+
+# Закрытая клетка на нормализованном (/8) входе сети
+CLOSED_INPUT = CLOSED / 8.0
 
 # Простой сверточный Q-Network для сапёра
 class QNetwork(nn.Module):
@@ -26,75 +34,348 @@ class QNetwork(nn.Module):
         x = self.conv(x)
         return self.fc(x)
 
+# Полностью свёрточная Q-сеть: одно Q-значение на клетку, без полносвязных слоёв
+class ConvQNetwork(nn.Module):
+    """
+    Веса не зависят от размера поля, поэтому одна модель обучается и играет
+    на 9x9, 16x16, 30x16 и т.д. Контекст вокруг клетки собирают остаточные блоки
+    со свёртками растущего расширения (dilation). input_shape и n_actions
+    принимаются для совместимости с QNetwork и не используются.
+    """
+    def __init__(self, input_shape=None, n_actions=None, channels=32, dilations=(1, 2, 4, 8, 1)):
+        super(ConvQNetwork, self).__init__()
+        # Второй входной канал из единиц: по нулевому дополнению сеть видит край поля
+        self.stem = nn.Sequential(
+            nn.Conv2d(2, channels, kernel_size=3, padding=1),
+            nn.ReLU(),
+        )
+        self.blocks = nn.ModuleList([
+            nn.Sequential(
+                nn.Conv2d(channels, channels, kernel_size=3, padding=d, dilation=d),
+                nn.ReLU(),
+            )
+            for d in dilations
+        ])
+        self.head = nn.Conv2d(channels, 1, kernel_size=1)
+    def forward(self, x):
+        x = x.unsqueeze(1)  # добавляем канал
+        x = self.stem(torch.cat([x, torch.ones_like(x)], dim=1))
+        for block in self.blocks:
+            x = x + block(x)
+        return self.head(x).flatten(1)
+
+# Архитектуры Q-сети, доступные агенту
+NETWORKS = {'dense': QNetwork, 'conv': ConvQNetwork}
+
+def quantize_network(network):
+    """
+    Копия сети для вывода на CPU: пары Conv2d+ReLU слиты в один модуль, веса nn.Linear
+    квантованы в int8 динамически (активации квантуются на лету при каждом вызове).
+    Свёртки остаются в float32 - динамическое квантование в torch их не поддерживает.
+    """
+    network = copy.deepcopy(network).cpu().eval()
+    pairs = [[f'{name}.0', f'{name}.1'] for name, module in network.named_modules()
+             if isinstance(module, nn.Sequential) and len(module) > 1
+             and isinstance(module[0], nn.Conv2d) and isinstance(module[1], nn.ReLU)]
+    if isinstance(network, QNetwork):
+        pairs.append(['conv.2', 'conv.3'])
+    network = torch.ao.quantization.fuse_modules(network, pairs)
+    return torch.ao.quantization.quantize_dynamic(network, {nn.Linear}, dtype=torch.qint8)
+
+def model_nbytes(network):
+    """Размер сохранённых весов сети в байтах."""
+    buffer = io.BytesIO()
+    torch.save(network.state_dict(), buffer)
+    return buffer.tell()
+
+def greedy_agreement(reference, candidate, states, masks=None):
+    """Доля полей, на которых жадные действия двух сетей совпадают (states нормализованы)."""
+    with torch.inference_mode():
+        states = torch.as_tensor(states, dtype=torch.float32)
+        q_ref, q_cand = reference(states), candidate(states)
+        if masks is not None:
+            masks = ~torch.as_tensor(masks)
+            q_ref, q_cand = q_ref.masked_fill(masks, float('-inf')), q_cand.masked_fill(masks, float('-inf'))
+        return float((q_ref.argmax(1) == q_cand.argmax(1)).float().mean())
+
+def check_checkpoint_board(path, rows, cols):
+    """
+    Проверяет без создания агента, что контрольная точка path подходит полю rows x cols:
+    у полносвязной сети выходов столько, сколько клеток поля, свёрточная подходит любому.
+    """
+    checkpoint = torch.load(path, map_location='cpu')
+    if checkpoint.get('arch', 'dense') == 'dense':
+        cells = checkpoint['q_network']['fc.3.weight'].shape[0]
+        if cells != rows * cols:
+            raise ValueError(f'контрольная точка полносвязной сети для поля из {cells} клеток, '
+                             f'а не {rows}x{cols}')
+
+def symmetry_indices(rows, cols):
+    """
+    Перестановки плоских индексов клеток для симметрий поля: на квадратном поле все 8
+    поворотов и отражений, иначе 4 (без поворотов на 90 градусов).
+    Возвращает (gather, scatter): после симметрии k клетка p берётся из gather[k][p],
+    а клетка a переходит в scatter[k][a].
+    """
+    cells = np.arange(rows * cols).reshape(rows, cols)
+    views = [cells, np.flipud(cells), np.fliplr(cells), np.rot90(cells, 2)]
+    if rows == cols:
+        views += [np.rot90(cells, 1), np.rot90(cells, 3), cells.T, np.rot90(cells, 2).T]
+    gather = np.stack([v.reshape(-1) for v in views])
+    return gather, np.argsort(gather, axis=1)
+
 class DQNAgent:
-    def __init__(self, state_shape, n_actions, lr=1e-3, gamma=0.99, epsilon_start=1.0, epsilon_final=0.1, epsilon_decay=10000, buffer_size=50000, batch_size=64):
-        self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-        self.q_network = QNetwork(state_shape, n_actions).to(self.device)
-        self.target_network = QNetwork(state_shape, n_actions).to(self.device)
-        self.target_network.load_state_dict(self.q_network.state_dict())
-        self.optimizer = optim.Adam(self.q_network.parameters(), lr=lr)
+    def __init__(self, state_shape, n_actions, lr=1e-3, gamma=0.99, epsilon_start=1.0, epsilon_final=0.1, epsilon_decay=10000, buffer_size=50000, batch_size=64, compact_replay=False,
+                 prioritized=False, per_alpha=0.6, per_beta=0.4, per_beta_steps=100000, arch='dense',
+                 augment=False, replay_dir=None, double=False, n_step=1, tau=None, target_update=1000, device=None):
+        # device: по умолчанию CUDA, если доступна
+        if device is None:
+            device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        self.device = torch.device(device)
+        self.state_shape = tuple(state_shape)
+        self.n_actions = n_actions
+        self.lr = lr
+        self._build_networks(arch)
         self.gamma = gamma
         self.epsilon = epsilon_start
         self.epsilon_final = epsilon_final
         self.epsilon_decay = epsilon_decay
-        self.n_actions = n_actions
         self.batch_size = batch_size
-        self.memory = deque(maxlen=buffer_size)
+        # double: действие следующего состояния выбирает q_network, а оценивает target_network (Double DQN);
+        # n_step: цели по n-шаговым возвратам из буфера опыта (см. ReplayBuffer.n_step_returns);
+        # tau: мягкое обновление target-сети после каждого шага (target += tau * (q - target))
+        # вместо копирования весов каждые target_update шагов
+        self.double = double
+        self.n_step = n_step
+        self.tau = tau
+        self.target_update = target_update
+        # compact_replay: буфер хранит сырые наблюдения в int8 и нормализует их при выборке,
+        # store тогда принимает наблюдения среды без деления на 8;
+        # replay_dir: буфер в файлах на диске, переживает перезапуск (см. ReplayBuffer)
+        if compact_replay:
+            self.memory = CompactReplayBuffer(buffer_size, storage_dir=replay_dir, n_step=n_step, gamma=gamma)
+        else:
+            self.memory = ReplayBuffer(buffer_size, storage_dir=replay_dir, n_step=n_step, gamma=gamma)
+        # prioritized: выборка по TD-ошибке (PER) с весами важности в функции потерь
+        self.prioritized = prioritized
+        if prioritized:
+            self.memory = PrioritizedReplayBuffer(self.memory, alpha=per_alpha,
+                                                  beta_start=per_beta, beta_steps=per_beta_steps)
+        # augment: к каждому переходу батча применяется случайная симметрия поля
+        self.augment = augment
+        self._sym_gather, self._sym_scatter = symmetry_indices(*self.state_shape)
         self.learn_step = 0
+        # Инструментирование (см. metrics.PhaseTimer) и последние loss/средний Q как тензоры,
+        # чтобы не синхронизироваться с устройством на каждом шаге
+        self.timer = None
+        self.last_loss = None
+        self.last_q = None
+        # Заранее выделенный вход для пакетного выбора действий (растёт по мере надобности)
+        self._infer_states = None
+        # Квантованная копия q_network для выбора действий на CPU (см. quantize)
+        self.quantized_network = None
+
+    def _build_networks(self, arch):
+        # arch: 'dense' - исходная сеть с полносвязной головой, 'conv' - ConvQNetwork
+        self.arch = arch
+        network = NETWORKS[arch]
+        self.q_network = network(self.state_shape, self.n_actions).to(self.device)
+        self.target_network = network(self.state_shape, self.n_actions).to(self.device)
+        self.target_network.load_state_dict(self.q_network.state_dict())
+        self.optimizer = optim.Adam(self.q_network.parameters(), lr=self.lr)
+        self.quantized_network = None
+
+    def quantize(self, states=None, masks=None):
+        """
+        Включает выбор действий квантованной копией q_network (quantize_network) - режим
+        для игры и оценки на CPU; обучение по-прежнему идёт в float32, и после update()
+        копию нужно пересоздать повторным вызовом. Если переданы поля states (и маски),
+        возвращает долю совпадений жадных действий с float-сетью на них.
+        """
+        if self.device.type != 'cpu':
+            raise ValueError('квантованный вывод поддерживается только на CPU')
+        self.quantized_network = quantize_network(self.q_network)
+        if states is not None:
+            return greedy_agreement(self.q_network, self.quantized_network, states, masks)
 
-    def select_action(self, state):
+    def _acting_network(self):
+        return self.q_network if self.quantized_network is None else self.quantized_network
+
+    def select_action(self, state, mask=None):
+        # mask - маска допустимых действий (закрытых клеток), см. MinesweeperEnv.legal_mask
         if random.random() < self.epsilon:
+            if mask is not None:
+                return int(random.choice(np.flatnonzero(mask)))
             return random.randint(0, self.n_actions - 1)
         state = torch.tensor(state, dtype=torch.float32, device=self.device).unsqueeze(0)
         with torch.no_grad():
-            q_values = self.q_network(state)
+            q_values = self._acting_network()(state)
+        if mask is not None:
+            q_values = q_values.masked_fill(~torch.as_tensor(mask, device=self.device), float('-inf'))
         return int(torch.argmax(q_values).item())
 
+    def select_action_hybrid(self, obs, n_mines=None):
+        """
+        Гибридный ход по сырому наблюдению obs (коды клеток, как в MinesweeperEnv):
+        клетка, безопасность которой следует из чисел на поле (solver.solve), а если такой
+        нет - выбор сети среди закрытых клеток, кроме найденных решателем мин.
+        Возвращает (действие, True если ход сделал решатель).
+        """
+        return hybrid_action(obs, n_mines, self.select_action)
+
+    def select_actions(self, states, masks=None):
+        """
+        Выбор действий сразу для N полей одним прямым проходом сети.
+        states: (N, rows, cols) нормализованные наблюдения; masks: (N, rows*cols)
+        маски допустимых действий. Epsilon-жадность применяется к каждой строке отдельно.
+        Возвращает массив из N индексов действий.
+        """
+        n = len(states)
+        shape = np.shape(states)[1:]
+        explore = np.random.random(n) < self.epsilon
+        actions = np.empty(n, dtype=np.int64)
+        if not explore.all():
+            # Буфер входа пересоздаётся, если не хватает строк или поля другого размера (свёрточная сеть)
+            if (self._infer_states is None or self._infer_states.shape[0] < n
+                    or tuple(self._infer_states.shape[1:]) != shape):
+                self._infer_states = torch.empty((n, *shape), dtype=torch.float32, device=self.device)
+            batch = self._infer_states[:n]
+            batch.copy_(torch.from_numpy(np.asarray(states)))
+            with torch.inference_mode():
+                q_values = self._acting_network()(batch)
+                if masks is not None:
+                    q_values.masked_fill_(~torch.from_numpy(np.asarray(masks)).to(self.device), float('-inf'))
+                actions[:] = q_values.argmax(1).cpu().numpy()
+        if explore.any():
+            # Случайное допустимое действие: argmax случайных чисел по разрешённым клеткам.
+            # Действий столько, сколько клеток у переданных полей, а не у поля, под которое создан агент
+            width = np.shape(masks)[1] if masks is not None else int(np.prod(shape))
+            scores = np.random.random((np.count_nonzero(explore), width))
+            if masks is not None:
+                scores[~np.asarray(masks)[explore]] = -1.0
+            actions[explore] = scores.argmax(1)
+        return actions
+
     def store(self, state, action, reward, next_state, done):
-        self.memory.append((state, action, reward, next_state, done))
+        self.memory.store(state, action, reward, next_state, done)
 
     def sample_memory(self):
-        batch = random.sample(self.memory, self.batch_size)
-        states, actions, rewards, next_states, dones = zip(*batch)
-        return (np.array(states), np.array(actions), np.array(rewards), np.array(next_states), np.array(dones))
+        return self.memory.sample(self.batch_size)
+
+    def augment_batch(self, states, actions, next_states):
+        """Случайная симметрия для каждой пары (state, next_state) батча; действие переносится вместе с полем."""
+        n = len(actions)
+        k = np.random.randint(len(self._sym_gather), size=n)
+        gather = self._sym_gather[k]
+        states = np.take_along_axis(states.reshape(n, -1), gather, axis=1).reshape(states.shape)
+        next_states = np.take_along_axis(next_states.reshape(n, -1), gather, axis=1).reshape(next_states.shape)
+        return states, self._sym_scatter[k, actions], next_states
 
     def update(self):
         if len(self.memory) < self.batch_size:
             return
-        states, actions, rewards, next_states, dones = self.sample_memory()
-        states = torch.tensor(states, dtype=torch.float32, device=self.device)
-        actions = torch.tensor(actions, dtype=torch.int64, device=self.device)
-        rewards = torch.tensor(rewards, dtype=torch.float32, device=self.device)
-        next_states = torch.tensor(next_states, dtype=torch.float32, device=self.device)
-        dones = torch.tensor(dones, dtype=torch.float32, device=self.device)
+        if self.prioritized:
+            batch, weights, indices = self.memory.sample(self.batch_size)
+        else:
+            batch = self.sample_memory()
+        # При n_step > 1 буфер добавляет множители gamma^k для следующего состояния
+        states, actions, rewards, next_states, dones = batch[:5]
+        discounts = torch.from_numpy(batch[5]).to(self.device) if len(batch) > 5 else self.gamma
+        if self.augment:
+            states, actions, next_states = self.augment_batch(states, actions, next_states)
+        if self.timer is not None:
+            self.timer.lap('replay_sample')
+        # Массивы батча уже нужных типов - оборачиваем без копирования
+        states = torch.from_numpy(states).to(self.device)
+        actions = torch.from_numpy(actions).to(self.device)
+        rewards = torch.from_numpy(rewards).to(self.device)
+        next_states = torch.from_numpy(next_states).to(self.device)
+        dones = torch.from_numpy(dones).to(self.device)
 
         q_values = self.q_network(states).gather(1, actions.unsqueeze(1)).squeeze(1)
         with torch.no_grad():
-            next_q_values = self.target_network(next_states).max(1)[0]
-        expected_q = rewards + self.gamma * next_q_values * (1 - dones)
-        loss = nn.MSELoss()(q_values, expected_q)
+            # Максимум только по закрытым клеткам следующего состояния
+            legal = next_states.flatten(1) == CLOSED_INPUT
+            if self.double:
+                next_actions = self.q_network(next_states).masked_fill(~legal, float('-inf')).argmax(1, keepdim=True)
+                next_q_values = self.target_network(next_states).gather(1, next_actions).squeeze(1)
+            else:
+                next_q_values = self.target_network(next_states).masked_fill(~legal, float('-inf')).max(1)[0]
+            next_q_values = torch.where(legal.any(1), next_q_values, torch.zeros_like(next_q_values))
+        expected_q = rewards + discounts * next_q_values * (1 - dones)
+        if self.prioritized:
+            td_errors = expected_q - q_values
+            weights = torch.from_numpy(weights).to(self.device)
+            loss = (weights * td_errors.pow(2)).mean()
+            self.memory.update_priorities(indices, td_errors.detach().cpu().numpy())
+        else:
+            loss = nn.MSELoss()(q_values, expected_q)
         self.optimizer.zero_grad()
         loss.backward()
         self.optimizer.step()
+        self.last_loss = loss.detach()
+        self.last_q = q_values.detach().mean()
 
         # Обновление epsilon
         self.epsilon = max(self.epsilon_final, self.epsilon - (1.0 - self.epsilon_final) / self.epsilon_decay)
-        # Периодически обновляем target-сеть
+        # Обновляем target-сеть: мягко на каждом шаге или копированием раз в target_update шагов
         self.learn_step += 1
-        if self.learn_step % 1000 == 0:
+        if self.tau is not None:
+            with torch.no_grad():
+                for target, source in zip(self.target_network.parameters(), self.q_network.parameters()):
+                    target.lerp_(source, self.tau)
+        elif self.learn_step % self.target_update == 0:
             self.target_network.load_state_dict(self.q_network.state_dict())
+        if self.timer is not None:
+            self.timer.lap('learn')
 
-    def save(self, path):
-        torch.save({
+    def checkpoint_state(self, full=False):
+        """
+        Снимок состояния агента с копиями тензоров на CPU - его можно писать в файл,
+        пока обучение продолжается. full=True добавляет всё, что нужно для продолжения
+        обучения: learn_step, состояния генераторов случайных чисел и буфер опыта.
+        """
+        state = {
             'q_network': self.q_network.state_dict(),
             'target_network': self.target_network.state_dict(),
             'optimizer': self.optimizer.state_dict(),
-            'epsilon': self.epsilon
-        }, path)
+            'epsilon': self.epsilon,
+            'arch': self.arch
+        }
+        if full:
+            state['learn_step'] = self.learn_step
+            state['rng'] = {
+                'python': random.getstate(),
+                'numpy': np.random.get_state(),
+                'torch': torch.get_rng_state()
+            }
+            state['replay'] = self.memory.state_dict()
+        return to_cpu(state)
+
+    def save(self, path, full=False):
+        atomic_save(self.checkpoint_state(full), path)
 
-    def load(self, path):
-        checkpoint = torch.load(path, map_location=self.device)
+    def load(self, path, resume=False):
+        """resume=True восстанавливает и состояние обучения, если оно есть в файле."""
+        # Файл читается на CPU: буфер опыта и состояния ГСЧ остаются там, а веса сетей и
+        # состояние оптимизатора переносит на устройство load_state_dict
+        checkpoint = torch.load(path, map_location='cpu')
+        # Архитектура берётся из файла (старые файлы - 'dense'); свёрточная сеть не зависит от размера поля
+        arch = checkpoint.get('arch', 'dense')
+        # _build_networks сбрасывает квантованную копию - запоминаем режим до пересоздания сетей
+        quantized = self.quantized_network is not None
+        if arch != self.arch:
+            self._build_networks(arch)
         self.q_network.load_state_dict(checkpoint['q_network'])
         self.target_network.load_state_dict(checkpoint['target_network'])
+        if quantized:
+            self.quantize()
         self.optimizer.load_state_dict(checkpoint['optimizer'])
-        self.epsilon = checkpoint['epsilon']
\ No newline at end of file
+        self.epsilon = checkpoint['epsilon']
+        if resume and 'learn_step' in checkpoint:
+            self.learn_step = checkpoint['learn_step']
+            rng = to_numpy(checkpoint['rng'])
+            random.setstate(rng['python'])
+            np.random.set_state(rng['numpy'])
+            torch.set_rng_state(checkpoint['rng']['torch'])
+            self.memory.load_state_dict(to_numpy(checkpoint['replay']))
\ No newline at end of file
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Оценка сохранённой модели без интерфейса: тысячи партий с фиксированными зёрнами
+на пуле процессов, жадная политика по допустимым ходам.
+
+    python evaluate.py dqn_weights.pth --games 5000 --workers 8
+"""
+
+import argparse
+import json
+import math
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from minesweeper_env import MinesweeperEnv
+
+# Политика процесса-исполнителя: загружается один раз в _init_worker
+_agent = None
+
+
+def _init_worker(model_path, state_shape, n_actions, quantize=False):
+    global _agent
+    import torch
+    from inference import is_artifact, load_policy
+    torch.set_num_threads(1)
+    if is_artifact(model_path):
+        _agent = load_policy(model_path)
+        return
+    from dqn_agent import DQNAgent
+    _agent = DQNAgent(state_shape, n_actions, buffer_size=1, epsilon_start=0.0, device='cpu')
+    _agent.load(model_path)
+    _agent.epsilon = 0.0
+    _agent.q_network.eval()
+    if quantize:
+        _agent.quantize()
+
+
+def play_games(seeds, env_kwargs, hybrid=False):
+    """
+    Играет партии с зёрнами seeds одновременно: на каждом ходе один прямой проход
+    сети по всем незаконченным полям. Партия с данным зерном не зависит от того,
+    в каком процессе и в какой пачке она сыграна. hybrid: ходы по полю выбирает
+    DQNAgent.select_action_hybrid (решатель, а сеть - только когда он не знает безопасного хода).
+    Возвращает массивы (победа, обрыв по max_steps, открыто клеток, ходов, ходов решателя).
+    """
+    envs = [MinesweeperEnv(**env_kwargs, seed=int(seed)) for seed in seeds]
+    n = len(envs)
+    obs = np.stack([env.reset() for env in envs])
+    wins = np.zeros(n, dtype=bool)
+    truncated = np.zeros(n, dtype=bool)
+    opened = np.zeros(n, dtype=np.int64)
+    moves = np.zeros(n, dtype=np.int64)
+    solver_moves = np.zeros(n, dtype=np.int64)
+    active = np.arange(n)
+    while len(active):
+        if hybrid:
+            actions = []
+            for i in active:
+                action, by_solver = _agent.select_action_hybrid(obs[i], envs[i].n_mines)
+                actions.append(action)
+                solver_moves[i] += by_solver
+        else:
+            masks = obs[active].reshape(len(active), -1) == -3
+            actions = _agent.select_actions(obs[active].astype(np.float32) / 8.0, masks)
+        still = []
+        for i, action in zip(active, actions):
+            obs[i], _, done, info = envs[i].step(int(action))
+            moves[i] += 1
+            if done:
+                wins[i] = 'win' in info
+                truncated[i] = info.get('truncated', False)
+                opened[i] = envs[i].opened
+            else:
+                still.append(i)
+        active = np.array(still, dtype=np.int64)
+    return wins, truncated, opened, moves, solver_moves
+
+
+def wilson_interval(successes, n, z=1.96):
+    """Доверительный интервал Уилсона для доли (по умолчанию 95%)."""
+    if n == 0:
+        return 0.0, 1.0
+    p = successes / n
+    denom = 1 + z * z / n
+    center = (p + z * z / (2 * n)) / denom
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denom
+    return max(0.0, center - half), min(1.0, center + half)
+
+
+def evaluate(model_path, games=1000, workers=None, seed=0, env_kwargs=None, chunk_size=64, hybrid=False,
+             quantize=False):
+    """
+    Играет games партий с зёрнами seed..seed+games-1; возвращает словарь со сводкой.
+    quantize: ходы выбирает квантованная копия сети (DQNAgent.quantize).
+    """
+    from inference import check_board, is_artifact, read_metadata
+    env_kwargs = dict(env_kwargs or {})
+    probe = MinesweeperEnv(**env_kwargs)
+    # Несовпадение поля проверяется до запуска пула: в процессе-исполнителе оно обрушило бы пул
+    if is_artifact(model_path):
+        check_board(read_metadata(model_path), *probe.observation_space)
+    else:
+        from dqn_agent import check_checkpoint_board
+        check_checkpoint_board(model_path, *probe.observation_space)
+    workers = workers or os.cpu_count()
+    seeds = np.arange(seed, seed + games)
+    chunks = [seeds[i:i + chunk_size] for i in range(0, games, chunk_size)]
+    start = time.perf_counter()
+    with ProcessPoolExecutor(workers, mp_context=mp.get_context('spawn'), initializer=_init_worker,
+                             initargs=(model_path, probe.observation_space, probe.action_space, quantize)) as pool:
+        parts = list(pool.map(play_games, chunks, [env_kwargs] * len(chunks), [hybrid] * len(chunks)))
+    elapsed = time.perf_counter() - start
+    wins, truncated, opened, moves, solver_moves = (np.concatenate(a) for a in zip(*parts))
+
+    n_wins = int(wins.sum())
+    low, high = wilson_interval(n_wins, games)
+    return {
+        'games': games,
+        'seed': seed,
+        'wins': n_wins,
+        'win_rate': n_wins / games,
+        'win_rate_ci95': [low, high],
+        'truncated': int(truncated.sum()),
+        'cells_opened': float(opened.mean()),
+        'safe_cells': probe.action_space - probe.n_mines,
+        'moves_per_game': float(moves.mean()),
+        'solver_move_share': float(solver_moves.sum() / moves.sum()),
+        'games_per_sec': games / elapsed,
+        'elapsed': elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Оценка модели на партиях с фиксированными зёрнами')
+    parser.add_argument('model', nargs='?', default='dqn_weights.pth', help='файл модели')
+    parser.add_argument('--games', type=int, default=1000, help='число партий')
+    parser.add_argument('--workers', type=int, default=None, help='процессов (по умолчанию по числу ядер)')
+    parser.add_argument('--seed', type=int, default=0, help='зерно первой партии')
+    parser.add_argument('--rows', type=int, default=16)
+    parser.add_argument('--cols', type=int, default=16)
+    parser.add_argument('--mines', type=int, default=40)
+    parser.add_argument('--max-steps', type=int, default=300, help='ограничение длины партии')
+    parser.add_argument('--hybrid', action='store_true',
+                        help='ходы решателя, где безопасная клетка выводится из чисел; сеть - в остальных')
+    parser.add_argument('--quantize', action='store_true', help='квантованная в int8 сеть (CPU)')
+    parser.add_argument('--json', help='сохранить сводку в JSON')
+    args = parser.parse_args()
+
+    env_kwargs = {'rows': args.rows, 'cols': args.cols, 'n_mines': args.mines, 'max_steps': args.max_steps}
+    try:
+        result = evaluate(args.model, args.games, args.workers, args.seed, env_kwargs, hybrid=args.hybrid,
+                          quantize=args.quantize)
+    except ValueError as e:
+        raise SystemExit(f'Ошибка: {e}')
+    low, high = result['win_rate_ci95']
+    print(f"Партий: {result['games']} (зёрна {args.seed}..{args.seed + args.games - 1}), "
+          f"поле {args.rows}x{args.cols}, мин {args.mines}")
+    print(f"Доля побед: {result['win_rate']:.2%} (95% ДИ {low:.2%} - {high:.2%})")
+    print(f"Открыто клеток: {result['cells_opened']:.1f} из {result['safe_cells']}")
+    print(f"Ходов за партию: {result['moves_per_game']:.1f}, обрывов по max_steps: {result['truncated']}")
+    if args.hybrid:
+        print(f"Ходов решателя: {result['solver_move_share']:.1%}")
+    print(f"Скорость: {result['games_per_sec']:.1f} партий/с")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Артефакт для игры: только q_network в виде TorchScript-графа (веса внутри) и
+метаданные поля. Загрузка не строит целевую сеть и оптимизатор; torch импортируется
+только при загрузке политики, так что интерфейсы могут открыть окно раньше.
+
+    python inference.py export dqn_weights.pth dqn_policy.pt --rows 16 --cols 16 --mines 40
+    python inference.py check-quantized dqn_weights.pth --boards boards_16x16.npz
+"""
+
+import argparse
+import json
+import os
+import warnings
+import zipfile
+
+import numpy as np
+
+from minesweeper_env import CLOSED, MinesweeperEnv
+from solver import hybrid_action
+
+FORMAT_VERSION = 1
+METADATA_FILE = 'meta.json'
+
+
+def export(checkpoint_path, artifact_path, rows=16, cols=16, n_mines=40, quantize=False):
+    """
+    Пишет артефакт из обучающей контрольной точки (DQNAgent.save); возвращает метаданные.
+    quantize: сеть в артефакте квантована для CPU (dqn_agent.quantize_network).
+    """
+    import torch
+    from dqn_agent import NETWORKS, quantize_network
+    checkpoint = torch.load(checkpoint_path, map_location='cpu')
+    arch = checkpoint.get('arch', 'dense')
+    network = NETWORKS[arch]((rows, cols), rows * cols)
+    network.load_state_dict(checkpoint['q_network'])
+    network.eval()
+    if quantize:
+        network = quantize_network(network)
+    with torch.inference_mode(), warnings.catch_warnings():
+        # Новые версии torch помечают TorchScript устаревшим, но он по-прежнему загружается без кода модели
+        warnings.simplefilter('ignore', FutureWarning)
+        traced = torch.jit.trace(network, torch.zeros(1, rows, cols))
+    metadata = {
+        'format': FORMAT_VERSION,
+        'arch': arch,
+        'rows': rows,
+        'cols': cols,
+        'n_mines': n_mines,
+        'obs_scale': 1 / 8.0,
+        'quantized': quantize,
+    }
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', FutureWarning)
+        torch.jit.save(traced, artifact_path, _extra_files={METADATA_FILE: json.dumps(metadata)})
+    return metadata
+
+
+def sample_boards(rows, cols, n_mines, count, seed=0):
+    """Наблюдения (count, rows, cols) из партий случайными допустимыми ходами."""
+    env = MinesweeperEnv(rows, cols, n_mines, seed=seed)
+    rng = np.random.default_rng(seed)
+    boards = []
+    obs = env.reset()
+    while len(boards) < count:
+        obs, _, done, _ = env.step(int(rng.choice(np.flatnonzero(env.legal_mask()))))
+        if done:
+            obs = env.reset()
+        else:
+            boards.append(obs)
+    return np.stack(boards)
+
+
+def load_boards(path, rows, cols, n_mines, count=2000, seed=0):
+    """Сохранённый набор полей из path; если файла нет - создаёт и сохраняет его."""
+    if os.path.exists(path):
+        return np.load(path)['boards']
+    boards = sample_boards(rows, cols, n_mines, count, seed)
+    np.savez_compressed(path, boards=boards.astype(np.int8))
+    return boards
+
+
+def check_quantized(checkpoint_path, boards):
+    """
+    Сравнивает квантованную сеть контрольной точки с float-сетью на полях boards (сырые
+    наблюдения): доля совпадений жадных действий, ускорение выбора хода и размер весов.
+    """
+    import time
+    from dqn_agent import DQNAgent, model_nbytes
+    rows, cols = boards.shape[1:]
+    agent = DQNAgent((rows, cols), rows * cols, buffer_size=1, epsilon_start=0.0, device='cpu')
+    agent.load(checkpoint_path)
+    agent.epsilon = 0.0
+    states = boards.astype(np.float32) / 8.0
+    masks = boards.reshape(len(boards), -1) == CLOSED
+
+    def seconds_per_move():
+        start = time.perf_counter()
+        for state, mask in zip(states[:200], masks[:200]):
+            agent.select_action(state, mask)
+        return (time.perf_counter() - start) / min(len(states), 200)
+
+    float_time = seconds_per_move()
+    agreement = agent.quantize(states, masks)
+    quant_time = seconds_per_move()
+    return {
+        'boards': len(boards),
+        'agreement': agreement,
+        'speedup': float_time / quant_time,
+        'float_bytes': model_nbytes(agent.q_network),
+        'quantized_bytes': model_nbytes(agent.quantized_network),
+    }
+
+
+def check_board(metadata, rows, cols):
+    """
+    Проверяет, что артефакт может играть на поле rows x cols: полносвязная сеть принимает
+    только поле, для которого экспортирована, свёрточная - поле любого размера.
+    """
+    if metadata['arch'] == 'dense' and (metadata['rows'], metadata['cols']) != (rows, cols):
+        raise ValueError(f"артефакт полносвязной сети для поля {metadata['rows']}x{metadata['cols']}, "
+                         f"а не {rows}x{cols}")
+
+
+def is_artifact(path):
+    """Отличает артефакт от обучающей контрольной точки без импорта torch."""
+    return read_metadata(path) is not None
+
+
+def read_metadata(path):
+    """Метаданные артефакта (или None для других файлов); torch не нужен."""
+    if not zipfile.is_zipfile(path):
+        return None
+    with zipfile.ZipFile(path) as archive:
+        for name in archive.namelist():
+            if name.endswith('/extra/' + METADATA_FILE):
+                return json.loads(archive.read(name))
+    return None
+
+
+class Policy:
+    """
+    Жадная политика из артефакта с тем же интерфейсом выбора хода, что у DQNAgent:
+    select_action / select_actions принимают нормализованные наблюдения,
+    select_action_hybrid - сырые.
+    """
+    def __init__(self, module, metadata):
+        self.module = module
+        self.metadata = metadata
+        self.state_shape = (metadata['rows'], metadata['cols'])
+        self.n_actions = metadata['rows'] * metadata['cols']
+        self.arch = metadata['arch']
+        self.epsilon = 0.0
+
+    def select_action(self, state, mask=None):
+        import torch
+        with torch.inference_mode():
+            q_values = self.module(torch.as_tensor(state, dtype=torch.float32).unsqueeze(0))[0]
+            if mask is not None:
+                q_values = q_values.masked_fill(~torch.as_tensor(mask), float('-inf'))
+            return int(q_values.argmax())
+
+    def select_actions(self, states, masks=None):
+        import torch
+        with torch.inference_mode():
+            q_values = self.module(torch.as_tensor(states, dtype=torch.float32))
+            if masks is not None:
+                q_values = q_values.masked_fill(~torch.as_tensor(masks), float('-inf'))
+            return q_values.argmax(1).numpy()
+
+    def select_action_hybrid(self, obs, n_mines=None):
+        return hybrid_action(obs, n_mines, self.select_action)
+
+
+def load_policy(path):
+    import torch
+    extra = {METADATA_FILE: ''}
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', FutureWarning)
+        module = torch.jit.load(path, map_location='cpu', _extra_files=extra)
+    module.eval()
+    metadata = json.loads(extra[METADATA_FILE])
+    if metadata.get('format') != FORMAT_VERSION:
+        raise ValueError(f"неизвестная версия артефакта: {metadata.get('format')}")
+    return Policy(module, metadata)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Артефакт модели для игры')
+    commands = parser.add_subparsers(dest='command', required=True)
+    export_cmd = commands.add_parser('export', help='записать артефакт из контрольной точки обучения')
+    export_cmd.add_argument('checkpoint', help='контрольная точка (dqn_weights.pth)')
+    export_cmd.add_argument('artifact', help='куда записать артефакт (например, dqn_policy.pt)')
+    export_cmd.add_argument('--rows', type=int, default=16)
+    export_cmd.add_argument('--cols', type=int, default=16)
+    export_cmd.add_argument('--mines', type=int, default=40)
+    export_cmd.add_argument('--quantize', action='store_true', help='квантовать сеть в int8 (для CPU)')
+    check_cmd = commands.add_parser('check-quantized',
+                                    help='сравнить квантованную сеть с float-сетью на сохранённых полях')
+    check_cmd.add_argument('checkpoint', help='контрольная точка (dqn_weights.pth)')
+    check_cmd.add_argument('--boards', default='boards.npz',
+                           help='набор полей (.npz); если файла нет, он создаётся из случайных партий')
+    check_cmd.add_argument('--rows', type=int, default=16)
+    check_cmd.add_argument('--cols', type=int, default=16)
+    check_cmd.add_argument('--mines', type=int, default=40)
+    info_cmd = commands.add_parser('info', help='показать метаданные артефакта')
+    info_cmd.add_argument('artifact')
+    args = parser.parse_args()
+    if args.command == 'export':
+        metadata = export(args.checkpoint, args.artifact, args.rows, args.cols, args.mines, args.quantize)
+        print(f"Артефакт записан в {args.artifact}: {metadata}")
+    elif args.command == 'check-quantized':
+        boards = load_boards(args.boards, args.rows, args.cols, args.mines)
+        result = check_quantized(args.checkpoint, boards)
+        print(f"Полей: {result['boards']} ({args.boards})")
+        print(f"Совпадение жадных действий: {result['agreement']:.2%}")
+        print(f"Ускорение выбора хода: {result['speedup']:.2f}x")
+        print(f"Веса: {result['float_bytes'] / 2**20:.1f} МБ -> {result['quantized_bytes'] / 2**20:.1f} МБ")
+    else:
+        print(read_metadata(args.artifact))
+
+
+if __name__ == '__main__':
+    main()
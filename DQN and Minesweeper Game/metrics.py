@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Инструментирование обучения: время по фазам цикла, журнал метрик с ротацией
+и отчёт по журналу:
+
+    python metrics.py metrics.jsonl
+"""
+
+import argparse
+import csv
+import glob
+import json
+import os
+import time
+
+# Фазы цикла обучения в train_dqn.py и DQNAgent.update
+PHASES = ('act', 'env', 'store', 'replay_sample', 'learn', 'checkpoint')
+
+
+class PhaseTimer:
+    """
+    Накопительное время по фазам. lap(phase) относит к фазе время с предыдущей отметки,
+    так что на фазу уходит один вызов perf_counter. При enabled=False ничего не измеряет.
+    """
+    def __init__(self, enabled=True, phases=PHASES):
+        self.enabled = enabled
+        self.totals = dict.fromkeys(phases, 0.0)
+        self._last = time.perf_counter()
+
+    def mark(self):
+        """Начинает отсчёт следующей фазы, не засчитывая прошедшее время."""
+        if self.enabled:
+            self._last = time.perf_counter()
+
+    def lap(self, phase):
+        if self.enabled:
+            now = time.perf_counter()
+            self.totals[phase] = self.totals.get(phase, 0.0) + now - self._last
+            self._last = now
+
+
+class MetricsLogger:
+    """
+    Журнал метрик: одна запись - один словарь. Формат по расширению файла:
+    .csv - CSV с заголовком, иначе JSONL. Когда файл превышает max_bytes, он
+    переименовывается в path.1 (path.1 - в path.2 и т.д., хранится backup_count копий).
+    """
+    def __init__(self, path, max_bytes=10 * 2 ** 20, backup_count=5):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.is_csv = path.endswith('.csv')
+        self.fields = None
+        self._file = None
+        self._writer = None
+        self._open()
+
+    def _open(self):
+        new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self._file = open(self.path, 'a', newline='' if self.is_csv else None, encoding='utf-8')
+        self._writer = None
+        if self.is_csv and not new:
+            # Продолжаем существующий CSV с его заголовком
+            with open(self.path, newline='', encoding='utf-8') as f:
+                self.fields = next(csv.reader(f), None)
+
+    def _rotate(self):
+        self._file.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            src = f'{self.path}.{i}'
+            if os.path.exists(src):
+                os.replace(src, f'{self.path}.{i + 1}')
+        if self.backup_count > 0:
+            os.replace(self.path, f'{self.path}.1')
+        else:
+            os.remove(self.path)
+        self._open()
+
+    def log(self, record):
+        if self._file.tell() >= self.max_bytes:
+            self._rotate()
+        if self.is_csv:
+            if self._writer is None:
+                if self.fields is None:
+                    self.fields = list(record)
+                self._writer = csv.DictWriter(self._file, self.fields, extrasaction='ignore')
+                if self._file.tell() == 0:
+                    self._writer.writeheader()
+            self._writer.writerow(record)
+        else:
+            self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def read_metrics(path):
+    """Читает журнал вместе с ротированными копиями в хронологическом порядке."""
+    # Только копии path.1, path.2, ...; прочие файлы с тем же началом (.bak, .swp) не журнал
+    rotated = [p for p in glob.glob(glob.escape(path) + '.*') if p[len(path) + 1:].isdecimal()]
+    rotated.sort(key=lambda p: int(p[len(path) + 1:]), reverse=True)
+    records = []
+    for file in rotated + [path]:
+        if not os.path.exists(file):
+            continue
+        with open(file, newline='', encoding='utf-8') as f:
+            if path.endswith('.csv'):
+                for row in csv.DictReader(f):
+                    records.append({k: float(v) for k, v in row.items() if v not in ('', None)})
+            else:
+                records.extend(json.loads(line) for line in f if line.strip())
+    return records
+
+
+def summarize(records, tail=10):
+    """Текстовый отчёт: распределение времени по фазам, скорости и качество игры."""
+    if not records:
+        return 'Журнал пуст'
+    last = records[-1]
+    recent = records[-tail:]
+    phase_times = {p[len('time_'):]: last[p] for p in last if p.startswith('time_')}
+    phase_total = sum(phase_times.values()) or 1.0
+
+    def mean(key, rows=recent):
+        values = [r[key] for r in rows if r.get(key) is not None]
+        return sum(values) / len(values) if values else float('nan')
+
+    lines = [
+        f"Записей: {len(records)}, эпизодов: {last.get('episode', 0):.0f}, "
+        f"время: {last.get('elapsed', 0):.0f} с",
+        f"Шагов среды: {last.get('env_steps', 0):.0f}, обновлений сети: {last.get('updates', 0):.0f}",
+        '',
+        'Время по фазам (накопительно):',
+    ]
+    for phase, seconds in sorted(phase_times.items(), key=lambda kv: -kv[1]):
+        lines.append(f"  {phase:<14} {seconds:>10.1f} с  {seconds / phase_total:>6.1%}")
+    lines += [
+        '',
+        f"Последние {len(recent)} записей (средние):",
+        f"  шагов среды/с      {mean('env_steps_per_sec'):>12.1f}",
+        f"  обновлений/с       {mean('updates_per_sec'):>12.1f}",
+        f"  loss               {mean('loss'):>12.4f}",
+        f"  средний Q          {mean('mean_q'):>12.4f}",
+        f"  длина эпизода      {mean('episode_length'):>12.1f}",
+        f"  доля побед         {mean('win_rate'):>12.1%}",
+        f"  epsilon            {last.get('epsilon', float('nan')):>12.3f}",
+        f"  буфер              {last.get('replay_size', 0):>12.0f} переходов, "
+        f"{last.get('replay_bytes', 0) / 2 ** 20:.1f} МБ",
+    ]
+    if len(records) > tail:
+        lines.append(f"  доля побед в начале {mean('win_rate', records[:tail]):>10.1%}")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Отчёт по журналу метрик обучения')
+    parser.add_argument('path', help='файл журнала (.jsonl или .csv)')
+    parser.add_argument('--tail', type=int, default=10, help='по скольким последним записям усреднять')
+    args = parser.parse_args()
+    print(summarize(read_metrics(args.path), args.tail))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,127 +1,57 @@
-from gc import disable
-from itertools import count
-from operator import index
+import argparse
 import tkinter as tk
-from random import shuffle
-import time 
-class MyButton(tk.Button):
-    def __init__(self, master,number, x, y, *args, **kwargs):
-        super(MyButton, self).__init__(master, width=3, font='TimesNewRoman 15 bold',*args,**kwargs)
-        self. x = x
-        self. y = y
-        self.number = number
-        self.is_mine = False
-    def __repr__(self):
-        return f'B{self.number, self.is_mine}'
+from minesweeper_env import MinesweeperEnv, MINE
+from board_view import make_board, VIEWS
+import numpy as np
 
 class Minesweeper:
-    window = tk.Tk()
-    buttons = []
-    ROW = 16
-    COLUMN = 16
-    MINE = 40
-    def __init__(self):
-        self.buttons = []
-        self.first_click = True  # Флаг первого клика
-        count = 1
-        for i in range(Minesweeper.ROW):
-            temp = []
-            for j in range(Minesweeper.COLUMN):
-                btn = MyButton(Minesweeper.window, x=i, y=j, number=count)
-                btn.config(command=lambda b=btn: self.click(b))
-                temp.append(btn)
-                count += 1
-            self.buttons.append(temp)
-    def createe_widget(self):
-        
-        for i in range(Minesweeper.ROW):
-            for j in range(Minesweeper.COLUMN):
-                btn = self.buttons[i][j]
-                btn.grid(row=i,column=j)
-    @staticmethod
-    def get_mine_places():
-        index = list(range(1, Minesweeper.COLUMN * Minesweeper.ROW +1))
-        shuffle(index)
-        return index[:Minesweeper.MINE]
-    def insert_mine(self, safe_coords=None):
-        # safe_coords - список координат, где не должно быть мин
-        all_indexes = [
-            (i, j)
-            for i in range(Minesweeper.ROW)
-            for j in range(Minesweeper.COLUMN)
-            if not safe_coords or (i, j) not in safe_coords
-        ]
-        shuffle(all_indexes)
-        mine_coords = all_indexes[:Minesweeper.MINE]
-        for i, j in mine_coords:
-            self.buttons[i][j].is_mine = True
-    def count_mines_around(self, btn: MyButton):
-        count_mine =0
-        for dx in [-1,0,1]:
-            for dy in [-1,0,1]:
-                if dx ==0 and dy ==0:
-                    continue
-                x, y = btn.x +dx, btn.y +dy
-                if 0<= x < Minesweeper.ROW and 0<= y <Minesweeper.COLUMN:
-                    neighbor = self.buttons[x][y]
-                    if neighbor.is_mine:
-                        count_mine+=1
-        return count_mine
-    def click(self, clicked_button: MyButton):
-        if self.first_click:
-            # Определяем координаты безопасной зоны (кнопка + соседи)
-            safe_coords = [
-                (clicked_button.x + dx, clicked_button.y + dy)
-                for dx in [-1, 0, 1]
-                for dy in [-1, 0, 1]
-                if 0 <= clicked_button.x + dx < Minesweeper.ROW and 0 <= clicked_button.y + dy < Minesweeper.COLUMN
-            ]
-            self.insert_mine(safe_coords)
-            self.first_click = False
-            # Открываем сразу все пустые клетки вокруг
-            self.open_empty_cells(clicked_button)
-            clicked_button.config(state='disabled')
+    def __init__(self, rows=16, cols=16, mines=40, view=None):
+        # view: 'buttons', 'canvas' или None (выбор по размеру поля, см. board_view.make_board)
+        self.ROW = rows
+        self.COLUMN = cols
+        self.MINE = mines
+        self.window = tk.Tk()
+        self.window.title('Сапёр')
+        # Правила игры - в среде (мины после первого клика, раскрытие пустых областей без рекурсии)
+        self.env = MinesweeperEnv(rows, cols, mines)
+        self.obs = self.env.reset()
+        self.board = make_board(view, self.window, rows, cols, self.click)
+        self.board.frame.pack()
+        self.message = None
+    def click(self, action):
+        if self.env.done:
             return
-        if clicked_button.is_mine:
-            clicked_button.config(text="*", background='red', disabledforeground='black')
+        _, _, done, info = self.env.step(action, out=self.obs)
+        cells = self.env.last_revealed
+        self.board.reveal(cells, self.obs.reshape(-1)[cells])
+        if 'lose' in info:
             self.LOSE()
-        else:
-            mines_around = self.count_mines_around(clicked_button)
-            clicked_button.config(text=mines_around)
-            if mines_around == 0:
-                self.open_empty_cells(clicked_button)
-        clicked_button.config(state='disabled')
-    def show_lose_message_and_restart(self):
-        lose_label = tk.Label(Minesweeper.window, text='YOU LOSE')
-        lose_label.place(relx=0.5,rely=0.5, anchor="center")
-        Minesweeper.window.update()
-     
+        elif 'win' in info:
+            self.WIN()
+    def show_message_and_restart(self, text, mine_color):
+        self.board.show_mines(np.flatnonzero(self.env.board == MINE), mine_color)
+        self.message = tk.Label(self.window, text=text)
+        self.message.place(relx=0.5, rely=0.5, anchor="center")
+        self.window.update()
+        self.window.after(1500, self.restart)
     def LOSE(self):
-        self.show_lose_message_and_restart()
-        for row in self.buttons:
-            for btn in row:
-                btn.destroy()
-        Minesweeper.window.after(1500, lambda:self.start())
+        self.show_message_and_restart('YOU LOSE', 'red')
+    def WIN(self):
+        self.show_message_and_restart('YOU WIN', 'green')
+    def restart(self):
+        self.message.destroy()
+        self.board.reset()
+        self.obs = self.env.reset()
+    def start(self):
+        self.window.mainloop()
 
-    def open_empty_cells(self, btn: MyButton):
-        for dx in [-1,0,1]:
-            for dy in [-1,0,1]:
-                if dx == 0 and dy == 0:
-                    continue
-                x, y = btn.x +dx, btn.y + dy
-                if 0<= x < Minesweeper.ROW and 0<= y < Minesweeper.COLUMN:
-                    neighbor = self.buttons[x][y]
-                    if neighbor['state'] == 'disabled':
-                        continue
-                    mines_around = self.count_mines_around(neighbor)
-                    neighbor.config(text=mines_around, state='disabled')
-                    if mines_around==0:
-                        self.open_empty_cells(neighbor)
-    def start(self):    
-        self.__init__()
-        self.createe_widget()
-        # Не размещаем мины заранее, только после первого клика
-        Minesweeper.window.mainloop()
-
-game = Minesweeper()
-game.start()
\ No newline at end of file
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Сапёр')
+    parser.add_argument('--rows', type=int, default=16)
+    parser.add_argument('--cols', type=int, default=16)
+    parser.add_argument('--mines', type=int, default=40)
+    parser.add_argument('--view', choices=list(VIEWS), default=None,
+                        help='отрисовка поля: кнопки или один холст (по умолчанию по размеру поля)')
+    args = parser.parse_args()
+    game = Minesweeper(args.rows, args.cols, args.mines, args.view)
+    game.start()
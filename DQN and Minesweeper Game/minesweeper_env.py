@@ -1,21 +1,80 @@
+from functools import lru_cache
+
 import numpy as np
-import random
+
+CLOSED = -3  # код закрытой клетки в наблюдении
+MINE = -1    # код мины на поле
+_NO_CELLS = np.zeros(0, dtype=np.int64)
+
+
+def _neighbour_counts(mines):
+    """Число мин в окрестности 3x3 каждой клетки для массива (..., rows, cols)."""
+    rows, cols = mines.shape[-2:]
+    padded = np.pad(mines.astype(int), [(0, 0)] * (mines.ndim - 2) + [(1, 1), (1, 1)])
+    counts = np.zeros(mines.shape, dtype=int)
+    for dx in range(3):
+        for dy in range(3):
+            if dx == 1 and dy == 1:
+                continue
+            counts += padded[..., dx:dx + rows, dy:dy + cols]
+    return counts
+
+
+def _dilate(mask):
+    """Расширение булевой маски (..., rows, cols) на окрестность 3x3."""
+    rows, cols = mask.shape[-2:]
+    padded = np.pad(mask, [(0, 0)] * (mask.ndim - 2) + [(1, 1), (1, 1)])
+    out = np.zeros(mask.shape, dtype=bool)
+    for dx in range(3):
+        for dy in range(3):
+            out |= padded[..., dx:dx + rows, dy:dy + cols]
+    return out
+
+
+@lru_cache(maxsize=8)
+def _neighbour_lists(rows, cols):
+    """Для каждой клетки - кортеж плоских индексов её соседей."""
+    lists = []
+    for x in range(rows):
+        for y in range(cols):
+            lists.append(tuple((x + dx) * cols + y + dy
+                               for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+                               if (dx or dy) and 0 <= x + dx < rows and 0 <= y + dy < cols))
+    return tuple(lists)
+
 
 class MinesweeperEnv:
     """
     Простая RL-среда для сапёра (16x16, 40 мин), совместимая с Gym.
     Состояние: матрица 16x16 (0 - закрыто, -1 - мина, 1-8 - число мин вокруг, -2 - открытое пустое)
     Действие: (x, y) - координаты клетки, которую открыть
+    readonly_obs: возвращать из reset/step не копию наблюдения, а общий буфер только для чтения
+    max_steps: после стольких ходов эпизод обрывается с info["truncated"]
+    seed: зерно собственного ГСЧ среды; одинаковое зерно и одинаковые ходы дают одинаковую игру
     """
-    def __init__(self, rows=16, cols=16, n_mines=40):
+    def __init__(self, rows=16, cols=16, n_mines=40, readonly_obs=False, max_steps=None, seed=None):
         self.rows = rows
         self.cols = cols
         self.n_mines = n_mines
         self.action_space = rows * cols
         self.observation_space = (rows, cols)
+        self.seed(seed)
+        self.readonly_obs = readonly_obs
+        self.max_steps = max_steps
+        # Наблюдение хранится постоянно и обновляется только в открытых за ход клетках
+        self._obs = np.full((rows, cols), CLOSED, dtype=int)
+        self._obs_view = self._obs.view()
+        self._obs_view.flags.writeable = False
         self.reset()
 
-    def reset(self):
+    def seed(self, seed=None):
+        """Пересоздаёт ГСЧ среды; seed=None - случайное зерно."""
+        self.np_random = np.random.default_rng(seed)
+
+    def reset(self, out=None, seed=None):
+        # seed: перед партией пересоздать ГСЧ, чтобы она не зависела от предыдущих
+        if seed is not None:
+            self.seed(seed)
         # 0 - закрыто, -1 - мина, -2 - открытое пустое, 1-8 - число мин вокруг
         self.board = np.zeros((self.rows, self.cols), dtype=int)
         self.visible = np.zeros((self.rows, self.cols), dtype=int)  # 0 - закрыто, 1 - открыто
@@ -23,34 +82,52 @@ class MinesweeperEnv:
         self.done = False
         self.first_move = True
         self.opened = 0
-        return self._get_obs()
+        self.steps = 0
+        self.last_revealed = _NO_CELLS  # плоские индексы клеток, открытых последним ходом
+        self._obs.fill(CLOSED)
+        return self._get_obs(out)
 
     def _place_mines(self, safe_coords):
         # safe_coords - список координат, где не должно быть мин (первый клик и соседи)
-        all_cells = [(i, j) for i in range(self.rows) for j in range(self.cols) if (i, j) not in safe_coords]
-        mines = random.sample(all_cells, self.n_mines)
-        for (i, j) in mines:
-            self.board[i, j] = -1
-            self.mines.add((i, j))
-        # Заполняем числа вокруг мин
-        for (i, j) in mines:
-            for dx in [-1, 0, 1]:
-                for dy in [-1, 0, 1]:
-                    ni, nj = i + dx, j + dy
-                    if 0 <= ni < self.rows and 0 <= nj < self.cols and self.board[ni, nj] != -1:
-                        self.board[ni, nj] += 1
-
-    def step(self, action):
+        safe = np.zeros((self.rows, self.cols), dtype=bool)
+        safe_idx = np.array(safe_coords, dtype=int).reshape(-1, 2)
+        safe[safe_idx[:, 0], safe_idx[:, 1]] = True
+        # Один вызов ГСЧ выбирает все мины среди клеток вне безопасной зоны
+        picks = self.np_random.choice(np.flatnonzero(~safe), self.n_mines, replace=False)
+        mines = np.zeros(self.rows * self.cols, dtype=bool)
+        mines[picks] = True
+        mines = mines.reshape(self.rows, self.cols)
+        # Числа вокруг мин - сумма сдвигов маски мин
+        self.board = np.where(mines, MINE, _neighbour_counts(mines))
+        self.mines = set(map(tuple, np.argwhere(mines).tolist()))
+        # Плоская копия поля списком: заливка читает его поэлементно
+        self._board_flat = self.board.ravel().tolist()
+
+    def step(self, action, out=None):
         """
         action: int (от 0 до rows*cols-1) или (x, y)
+        out: необязательный массив (rows, cols), куда записывается наблюдение
         Возвращает: obs, reward, done, info
         """
-        if isinstance(action, int):
-            x, y = divmod(action, self.cols)
+        if isinstance(action, (int, np.integer)):
+            x, y = divmod(int(action), self.cols)
         else:
             x, y = action
-        if self.done or self.visible[x, y]:
-            return self._get_obs(), 0.0, self.done, {}
+        self.last_revealed = _NO_CELLS
+        if self.done:
+            return self._get_obs(out), 0.0, self.done, {}
+        reward, info = self._play(x, y)
+        # Ограничение длины эпизода: обрываем игру, но не считаем это проигрышем
+        self.steps += 1
+        if not self.done and self.max_steps is not None and self.steps >= self.max_steps:
+            self.done = True
+            info["truncated"] = True
+        return self._get_obs(out), reward, self.done, info
+
+    def _play(self, x, y):
+        # Ход по уже открытой клетке ничего не меняет
+        if self.visible[x, y]:
+            return 0.0, {}
         # Первый ход - размещаем мины
         if self.first_move:
             safe = [(x + dx, y + dy) for dx in [-1,0,1] for dy in [-1,0,1]
@@ -60,44 +137,59 @@ class MinesweeperEnv:
         # Если мина - проигрыш
         if self.board[x, y] == -1:
             self.visible[x, y] = 1
+            self._obs[x, y] = MINE
+            self.last_revealed = np.array([x * self.cols + y])
             self.done = True
-            reward = -10.0
-            return self._get_obs(), reward, self.done, {"lose": True}
+            return -10.0, {"lose": True}
         # Открываем клетку (и пустые вокруг)
         opened_now = self._open_cell(x, y)
         self.opened += opened_now
         # Проверка на победу
         if self.opened == self.rows * self.cols - self.n_mines:
             self.done = True
-            return self._get_obs(), 10.0, True, {"win": True}
-        return self._get_obs(), 0.1 * opened_now, False, {}
+            return 10.0, {"win": True}
+        return 0.1 * opened_now, {}
+
+    def legal_mask(self):
+        """Маска допустимых действий (rows*cols,): True для ещё закрытых клеток."""
+        return self.visible.reshape(-1) == 0
 
     def _open_cell(self, x, y):
-        # BFS для открытия пустых клеток
-        stack = [(x, y)]
-        opened = 0
+        # Числовая клетка открывается одна, пустая - вместе со всей своей областью
+        start = x * self.cols + y
+        if self._board_flat[start] != 0:
+            self.visible[x, y] = 1
+            self._obs[x, y] = self.board[x, y]
+            self.last_revealed = np.array([start])
+            return 1
+        # Заливка от клетки клика по спискам соседей: только по ещё закрытым клеткам
+        board = self._board_flat
+        neighbours = _neighbour_lists(self.rows, self.cols)
+        visible = self.visible.reshape(-1)
+        seen = {start}
+        stack = [start]
         while stack:
-            i, j = stack.pop()
-            if self.visible[i, j]:
-                continue
-            self.visible[i, j] = 1
-            opened += 1
-            if self.board[i, j] == 0:
-                for dx in [-1, 0, 1]:
-                    for dy in [-1, 0, 1]:
-                        ni, nj = i + dx, j + dy
-                        if 0 <= ni < self.rows and 0 <= nj < self.cols and not self.visible[ni, nj]:
-                            stack.append((ni, nj))
-        return opened
+            cell = stack.pop()
+            for n in neighbours[cell]:
+                if n not in seen and not visible[n]:
+                    seen.add(n)
+                    if board[n] == 0:
+                        stack.append(n)
+        cells = np.fromiter(seen, dtype=np.int64, count=len(seen))
+        cells.sort()
+        self.last_revealed = cells
+        visible[cells] = 1
+        self._obs.reshape(-1)[cells] = self.board.reshape(-1)[cells]
+        return len(cells)
 
-    def _get_obs(self):
-        # Возвращает видимое поле: -3 (закрыто), -1 (мину не показываем), 0-8 (открыто)
-        obs = np.full((self.rows, self.cols), -3, dtype=int)
-        for i in range(self.rows):
-            for j in range(self.cols):
-                if self.visible[i, j]:
-                    obs[i, j] = self.board[i, j]
-        return obs.copy()
+    def _get_obs(self, out=None):
+        # Видимое поле: -3 (закрыто), -1 (мина, только после проигрыша), 0-8 (открыто)
+        if out is not None:
+            np.copyto(out, self._obs)
+            return out
+        if self.readonly_obs:
+            return self._obs_view
+        return self._obs.copy()
 
     def render(self):
         # Текстовый вывод поля
@@ -114,6 +206,125 @@ class MinesweeperEnv:
             print(row)
         print()
 
+class VecMinesweeperEnv:
+    """
+    Векторизованная среда: N независимых полей хранятся в массивах (N, rows, cols)
+    и делают ход одним вызовом NumPy. Награды и условия победы/поражения те же,
+    что и в MinesweeperEnv.step. Законченные поля перезапускаются автоматически,
+    их последнее наблюдение возвращается в info['final_obs']. Поля, достигшие max_steps
+    ходов, обрываются и отмечаются в info['truncated'].
+    """
+    def __init__(self, n_envs, rows=16, cols=16, n_mines=40, seed=None, max_steps=None):
+        self.n_envs = n_envs
+        self.rows = rows
+        self.cols = cols
+        self.n_mines = n_mines
+        self.action_space = rows * cols
+        self.observation_space = (rows, cols)
+        self.max_steps = max_steps
+        self.rng = np.random.default_rng(seed)
+        self.board = np.zeros((n_envs, rows, cols), dtype=int)
+        self.visible = np.zeros((n_envs, rows, cols), dtype=bool)
+        self.first_move = np.ones(n_envs, dtype=bool)
+        self.opened = np.zeros(n_envs, dtype=int)
+        self.steps = np.zeros(n_envs, dtype=int)
+        self.reset()
+
+    def reset(self, mask=None):
+        """Сбрасывает поля, отмеченные в mask (по умолчанию все); возвращает наблюдения всех полей."""
+        if mask is None:
+            mask = np.ones(self.n_envs, dtype=bool)
+        self.board[mask] = 0
+        self.visible[mask] = False
+        self.first_move[mask] = True
+        self.opened[mask] = 0
+        self.steps[mask] = 0
+        return self._get_obs()
+
+    def _place_mines(self, idx, x, y):
+        # Случайные ключи для всех клеток; у безопасной зоны 3x3 ключ заведомо больше
+        k = len(idx)
+        scores = self.rng.random((k, self.rows * self.cols))
+        rr = np.arange(self.rows)[None, :, None]
+        cc = np.arange(self.cols)[None, None, :]
+        safe = (np.abs(rr - x[:, None, None]) <= 1) & (np.abs(cc - y[:, None, None]) <= 1)
+        scores[safe.reshape(k, -1)] = 2.0
+        picks = np.argpartition(scores, self.n_mines - 1, axis=1)[:, :self.n_mines]
+        mines = np.zeros((k, self.rows * self.cols), dtype=bool)
+        mines[np.arange(k)[:, None], picks] = True
+        mines = mines.reshape(k, self.rows, self.cols)
+        self.board[idx] = np.where(mines, MINE, _neighbour_counts(mines))
+
+    def step(self, actions):
+        """
+        actions: массив (N,) индексов клеток или (N, 2) координат
+        Возвращает: obs (N, rows, cols), rewards (N,), dones (N,), info
+        """
+        actions = np.asarray(actions)
+        if actions.ndim == 2:
+            x, y = actions[:, 0], actions[:, 1]
+        else:
+            x, y = np.divmod(actions, self.cols)
+        envs = np.arange(self.n_envs)
+        rewards = np.zeros(self.n_envs)
+        dones = np.zeros(self.n_envs, dtype=bool)
+        # Ход по уже открытой клетке ничего не меняет
+        active = ~self.visible[envs, x, y]
+        # Первый ход - размещаем мины
+        first = active & self.first_move
+        if first.any():
+            self._place_mines(np.flatnonzero(first), x[first], y[first])
+            self.first_move[first] = False
+        # Мина - проигрыш
+        lose = active & (self.board[envs, x, y] == MINE)
+        self.visible[envs[lose], x[lose], y[lose]] = True
+        rewards[lose] = -10.0
+        # Открываем клетки (и пустые вокруг)
+        safe = active & ~lose
+        opened_now = self._open_cells(np.flatnonzero(safe), x[safe], y[safe])
+        self.opened += opened_now
+        rewards[safe] = 0.1 * opened_now[safe]
+        # Проверка на победу
+        win = safe & (self.opened == self.rows * self.cols - self.n_mines)
+        rewards[win] = 10.0
+        self.steps += 1
+        truncated = np.zeros(self.n_envs, dtype=bool)
+        if self.max_steps is not None:
+            truncated = ~(win | lose) & (self.steps >= self.max_steps)
+        dones = win | lose | truncated
+        obs = self._get_obs()
+        info = {"win": win, "lose": lose, "truncated": truncated}
+        if dones.any():
+            info["final_obs"] = obs
+            obs = self.reset(dones)
+        return obs, rewards, dones, info
+
+    def _open_cells(self, idx, x, y):
+        # Заливка сразу по всем выбранным полям: расширяем фронт пустых клеток до остановки
+        opened = np.zeros(self.n_envs, dtype=int)
+        if len(idx) == 0:
+            return opened
+        board = self.board[idx]
+        visible = self.visible[idx]
+        reveal = np.zeros_like(visible)
+        reveal[np.arange(len(idx)), x, y] = True
+        frontier = reveal & (board == 0)
+        while frontier.any():
+            grow = _dilate(frontier) & ~visible & ~reveal
+            reveal |= grow
+            frontier = grow & (board == 0)
+        self.visible[idx] = visible | reveal
+        opened[idx] = reveal.sum(axis=(1, 2))
+        return opened
+
+    def legal_mask(self):
+        """Маски допустимых действий (N, rows*cols): True для ещё закрытых клеток."""
+        return ~self.visible.reshape(self.n_envs, -1)
+
+    def _get_obs(self):
+        return np.where(self.visible, self.board, CLOSED)
+
+
 if __name__ == "__main__":
     env = MinesweeperEnv()
     obs = env.reset()
@@ -121,7 +332,7 @@ if __name__ == "__main__":
     done = False
     while not done:
         # Случайный ход
-        action = random.randint(0, env.action_space - 1)
+        action = int(env.np_random.integers(env.action_space))
         obs, reward, done, info = env.step(action)
         env.render()
         print(f"Reward: {reward}")
@@ -0,0 +1,446 @@
+import json
+import os
+
+import numpy as np
+
+
+class ReplayBuffer:
+    """
+    Кольцевой буфер опыта на заранее выделенных массивах NumPy.
+    Массивы создаются при первой записи по форме состояния; батч собирается
+    одной индексацией и сразу годится для torch.from_numpy без копирования.
+
+    storage_dir: массивы лежат в файлах .npy этого каталога и отображаются в память
+    (np.memmap), так что ёмкость ограничена диском, а не ОЗУ. Счётчики пишутся в
+    meta.json при flush(); если каталог уже содержит буфер, он открывается заново
+    с тем содержимым, что было на момент последнего flush(). readonly=True открывает
+    существующий буфер только для выборки - таких читателей может быть несколько,
+    refresh() подхватывает счётчики после очередного flush() писателя.
+
+    n_step > 1: батч содержит n-шаговые возвраты - награда суммируется с дисконтом gamma
+    по следующим переходам того же эпизода (не дальше его конца), next_state берётся
+    через k <= n_step ходов, а шестым элементом батча идёт множитель gamma^k для оценки
+    следующего состояния. Переход продолжает эпизод, если его state совпадает с
+    next_state предыдущего записанного перехода (флаг cont у предыдущего слота); переходы
+    нескольких сред, записанные вперемешку, дают просто более короткие возвраты.
+    """
+    # Массивы и счётчики, из которых состоит сохраняемое состояние буфера
+    _fields = ('states', 'actions', 'rewards', 'next_states', 'dones', 'cont')
+    _scalars = ('pos', 'size')
+
+    def __init__(self, capacity, seed=None, storage_dir=None, readonly=False, n_step=1, gamma=0.99):
+        self.capacity = capacity
+        self.n_step = n_step
+        self.gamma = gamma
+        self.rng = np.random.default_rng(seed)
+        self.pos = 0   # куда пишется следующий переход
+        self.size = 0  # сколько переходов сейчас в буфере
+        self.states = None
+        self.storage_dir = storage_dir
+        self.readonly = readonly
+        if storage_dir is not None:
+            if os.path.exists(self._meta_path()):
+                self._open_storage()
+            elif readonly:
+                raise FileNotFoundError(f"в {storage_dir} нет буфера опыта")
+            else:
+                os.makedirs(storage_dir, exist_ok=True)
+
+    def _allocate(self, state_shape):
+        self.state_shape = tuple(state_shape)
+        self.states = self._new_array('states', (self.capacity, *state_shape), np.float32)
+        self.actions = self._new_array('actions', (self.capacity,), np.int64)
+        self.rewards = self._new_array('rewards', (self.capacity,), np.float32)
+        self.next_states = self._new_array('next_states', (self.capacity, *state_shape), np.float32)
+        self.dones = self._new_array('dones', (self.capacity,), np.float32)
+        self.cont = self._new_array('cont', (self.capacity,), bool)
+        self.cont[:] = False
+
+    def _new_array(self, name, shape, dtype):
+        if self.storage_dir is None:
+            return np.empty(shape, dtype=dtype)
+        return np.lib.format.open_memmap(os.path.join(self.storage_dir, f'{name}.npy'), mode='w+',
+                                         dtype=dtype, shape=shape)
+
+    def _meta_path(self):
+        return os.path.join(self.storage_dir, 'meta.json')
+
+    def _read_meta(self):
+        with open(self._meta_path()) as f:
+            meta = json.load(f)
+        if meta['type'] != type(self).__name__ or meta['capacity'] != self.capacity:
+            raise ValueError(f"в {self.storage_dir} лежит {meta['type']} ёмкостью {meta['capacity']}")
+        for name in self._scalars:
+            setattr(self, name, meta[name])
+        return meta
+
+    def _open_storage(self):
+        meta = self._read_meta()
+        if meta['state_shape'] is None:
+            return
+        self.state_shape = tuple(meta['state_shape'])
+        mode = 'r' if self.readonly else 'r+'
+        for name in self._fields:
+            path = os.path.join(self.storage_dir, f'{name}.npy')
+            if name == 'cont' and not os.path.exists(path):
+                # Буфер записан до появления флагов продолжения эпизода - n-шаговые возвраты по нему одношаговые
+                if self.readonly:
+                    cont = np.zeros(self.capacity, dtype=bool)
+                else:
+                    cont = self._new_array(name, (self.capacity,), bool)
+                    cont[:] = False
+                setattr(self, name, cont)
+                continue
+            setattr(self, name, np.lib.format.open_memmap(path, mode=mode))
+        self.states = getattr(self, self._fields[0])
+
+    def flush(self):
+        """Сбрасывает массивы на диск и атомарно обновляет meta.json (только для storage_dir)."""
+        if self.storage_dir is None or self.readonly:
+            return
+        if self.states is not None:
+            for name in self._fields:
+                getattr(self, name).flush()
+        meta = {name: getattr(self, name) for name in self._scalars}
+        meta.update(type=type(self).__name__, capacity=self.capacity,
+                    state_shape=None if self.states is None else list(self.state_shape))
+        tmp = self._meta_path() + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._meta_path())
+
+    def refresh(self):
+        """Для читателя: перечитывает счётчики, записанные последним flush() писателя."""
+        if self.states is None:
+            self._open_storage()
+        else:
+            self._read_meta()
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def nbytes(self):
+        """Память под массивы буфера в байтах."""
+        arrays = {id(v): v for v in vars(self).values() if isinstance(v, np.ndarray)}
+        return sum(a.nbytes for a in arrays.values())
+
+    def store(self, state, action, reward, next_state, done):
+        """Копирует переход в буфер (вытесняя самый старый) и возвращает его индекс."""
+        if self.states is None:
+            self._allocate(np.shape(state))
+        i = self.pos
+        prev = (i - 1) % self.capacity
+        # Связь с предыдущим переходом нужна только n-шаговым возвратам; по done её не
+        # определить - обрыв по max_steps не помечается концом эпизода
+        continues = (self.n_step > 1 and self.size > 0 and prev != i and not self.dones[prev]
+                     and np.array_equal(self.next_states[prev], state))
+        self.states[i] = state
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.next_states[i] = next_state
+        self.dones[i] = done
+        self.cont[i] = False
+        if continues:
+            self.cont[prev] = True
+        self.pos = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        return i
+
+    def sample_indices(self, batch_size):
+        # Равномерная выборка с возвращением
+        return self.rng.integers(0, self.size, batch_size)
+
+    def n_step_returns(self, idx):
+        """
+        Возвраты за n_step ходов сразу для всего батча: на шаге k к наградам ещё живых
+        переходов (эпизод не кончился и следующий переход записан) прибавляется
+        gamma^k * награда следующего слота. Возвращает (rewards, dones, last, discounts):
+        last - слот, чей next_state служит следующим состоянием, discounts - gamma^k.
+        Следующий переход эпизода всегда лежит в слоте (i + 1) % capacity: пока слот i
+        не перезаписан, следующий за ним тоже цел, а запись в слот сбрасывает его cont.
+        """
+        rewards = self.rewards[idx].astype(np.float32)
+        dones = self.dones[idx].astype(np.float32)
+        discounts = np.full(len(idx), self.gamma, dtype=np.float32)
+        last = np.array(idx, dtype=np.int64)
+        alive = self.cont[last] & (dones == 0)
+        for _ in range(self.n_step - 1):
+            if not alive.any():
+                break
+            nxt = (last[alive] + 1) % self.capacity
+            rewards[alive] += discounts[alive] * self.rewards[nxt]
+            dones[alive] = self.dones[nxt]
+            discounts[alive] *= self.gamma
+            last[alive] = nxt
+            alive &= self.cont[last] & (dones == 0)
+        return rewards, dones, last, discounts
+
+    def gather(self, idx):
+        """
+        Возвращает (states, actions, rewards, next_states, dones) для индексов idx,
+        при n_step > 1 - ещё и discounts (см. n_step_returns).
+        """
+        if self.n_step > 1:
+            rewards, dones, last, discounts = self.n_step_returns(idx)
+            return (self.states[idx], self.actions[idx], rewards, self.next_states[last], dones, discounts)
+        return (self.states[idx], self.actions[idx], self.rewards[idx],
+                self.next_states[idx], self.dones[idx])
+
+    def sample(self, batch_size):
+        return self.gather(self.sample_indices(batch_size))
+
+    def transition_slots(self):
+        """Индексы слотов, в которых лежат переходы."""
+        return np.arange(self.size)
+
+    def state_dict(self):
+        """
+        Копия содержимого буфера (только заполненная часть), счётчиков и состояния ГСЧ.
+        Буфер на диске вместо копии сбрасывается flush() и в состояние попадает только ГСЧ.
+        """
+        state = {name: getattr(self, name) for name in self._scalars}
+        state['capacity'] = self.capacity
+        state['rng'] = self.rng.bit_generator.state
+        if self.storage_dir is not None:
+            self.flush()
+        elif self.states is not None:
+            for name in self._fields:
+                state[name] = getattr(self, name)[:self.size].copy()
+        return state
+
+    def load_state_dict(self, state):
+        # Кольцо восстанавливается слот в слот, поэтому ёмкость должна совпадать
+        if state['capacity'] != self.capacity:
+            raise ValueError(f"ёмкость сохранённого буфера {state['capacity']}, а не {self.capacity}")
+        self.rng.bit_generator.state = state['rng']
+        # Содержимое и счётчики буфера на диске уже открыты из storage_dir
+        if self._fields[0] in state:
+            for name in self._scalars:
+                setattr(self, name, state[name])
+            self._allocate(np.shape(state[self._fields[0]])[1:])
+            for name in self._fields:
+                # В старых контрольных точках нет cont - переходы считаются не связанными
+                if name in state:
+                    getattr(self, name)[:self.size] = state[name]
+
+
+class CompactReplayBuffer(ReplayBuffer):
+    """
+    Компактный буфер: сырые коды клеток (-3..8) хранятся в int8 по одному кадру на слот.
+    Состояние перехода в слоте i - кадр i, следующее состояние - кадр i+1, так что
+    next_state одного хода и state следующего хранятся один раз. На границе эпизода
+    последний next_state занимает отдельный слот-кадр, который не выбирается как переход.
+    Нормализация (obs_scale) применяется только при сборке батча.
+    """
+    _fields = ('frames', 'actions', 'rewards', 'dones', 'valid', 'cont')
+    _scalars = ('pos', 'size', 'n_valid', '_last_done')
+
+    def __init__(self, capacity, obs_scale=1 / 8.0, seed=None, storage_dir=None, readonly=False, n_step=1,
+                 gamma=0.99):
+        self.obs_scale = obs_scale
+        self.n_valid = 0         # число полноценных переходов
+        self._last_done = True   # последний переход закончил эпизод (или переходов ещё не было)
+        super().__init__(capacity, seed, storage_dir, readonly, n_step, gamma)
+
+    def _allocate(self, state_shape):
+        self.state_shape = tuple(state_shape)
+        self.frames = self._new_array('frames', (self.capacity, *state_shape), np.int8)
+        self.actions = self._new_array('actions', (self.capacity,), np.int64)
+        self.rewards = self._new_array('rewards', (self.capacity,), np.float32)
+        self.dones = self._new_array('dones', (self.capacity,), np.float32)
+        self.valid = self._new_array('valid', (self.capacity,), bool)
+        self.valid[:] = False
+        self.cont = self._new_array('cont', (self.capacity,), bool)
+        self.cont[:] = False
+        self.states = self.frames
+
+    def __len__(self):
+        return self.n_valid
+
+    def _write_frame(self, frame):
+        # Пишет кадр в следующий слот, вытесняя самый старый переход
+        i = self.pos
+        if self.valid[i]:
+            self.valid[i] = False
+            self.n_valid -= 1
+        self.cont[i] = False
+        self.frames[i] = frame
+        self.pos = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        return i
+
+    def store(self, state, action, reward, next_state, done):
+        """state/next_state - сырые наблюдения среды; возвращает индекс слота перехода."""
+        if self.states is None:
+            self._allocate(np.shape(state))
+        last = (self.pos - 1) % self.capacity
+        # Продолжение эпизода: state совпадает с последним записанным next_state
+        if not self._last_done and np.array_equal(self.frames[last], state):
+            i = last
+            # Предыдущий переход эпизода - в слоте перед кадром state
+            self.cont[(last - 1) % self.capacity] = True
+        else:
+            i = self._write_frame(state)
+        self._write_frame(next_state)
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.dones[i] = done
+        self.valid[i] = True
+        self.n_valid += 1
+        self._last_done = bool(done)
+        return i
+
+    def transition_slots(self):
+        return np.flatnonzero(self.valid[:self.size])
+
+    def sample_indices(self, batch_size):
+        # Равномерно по слотам с переходами: слоты-кадры перевыбираются
+        idx = self.rng.integers(0, self.size, batch_size)
+        bad = ~self.valid[idx]
+        while bad.any():
+            idx[bad] = self.rng.integers(0, self.size, np.count_nonzero(bad))
+            bad = ~self.valid[idx]
+        return idx
+
+    def gather(self, idx):
+        states = self.frames[idx].astype(np.float32)
+        states *= self.obs_scale
+        if self.n_step > 1:
+            rewards, dones, last, discounts = self.n_step_returns(idx)
+        else:
+            rewards, dones, last = self.rewards[idx], self.dones[idx], idx
+        next_states = self.frames[(last + 1) % self.capacity].astype(np.float32)
+        next_states *= self.obs_scale
+        if self.n_step > 1:
+            return (states, self.actions[idx], rewards, next_states, dones, discounts)
+        return (states, self.actions[idx], rewards, next_states, dones)
+
+
+class SumTree:
+    """
+    Сумма-дерево на массиве: листья - приоритеты слотов буфера, узел - сумма поддерева.
+    Обновление и поиск работают сразу для батча индексов за O(log n) шагов NumPy.
+    """
+    def __init__(self, capacity):
+        self.n_leaves = 1 << max(capacity - 1, 1).bit_length()
+        self.tree = np.zeros(2 * self.n_leaves, dtype=np.float64)
+
+    def total(self):
+        return self.tree[1]
+
+    def priorities(self, idx):
+        return self.tree[np.asarray(idx) + self.n_leaves]
+
+    def set(self, i, priority):
+        """Обновление одного листа без накладных расходов NumPy на маленьких массивах."""
+        node = int(i) + self.n_leaves
+        tree = self.tree
+        tree[node] = priority
+        node //= 2
+        while node >= 1:
+            tree[node] = tree[2 * node] + tree[2 * node + 1]
+            node //= 2
+
+    def update(self, idx, priorities):
+        node = np.asarray(idx) + self.n_leaves
+        self.tree[node] = priorities
+        # Все листья на одной глубине - пересчитываем родителей уровень за уровнем
+        node = np.unique(node // 2)
+        while True:
+            self.tree[node] = self.tree[2 * node] + self.tree[2 * node + 1]
+            if node[0] == 1:
+                break
+            node = np.unique(node // 2)
+
+    def find(self, values):
+        """Для каждого значения из (0, total] находит лист, на чей отрезок префиксных сумм оно попадает."""
+        values = np.array(values, dtype=np.float64)
+        node = np.ones(len(values), dtype=np.int64)
+        while node[0] < self.n_leaves:
+            left = 2 * node
+            go_right = values > self.tree[left]
+            values -= np.where(go_right, self.tree[left], 0.0)
+            node = left + go_right
+        return node - self.n_leaves
+
+
+class PrioritizedReplayBuffer:
+    """
+    Приоритизированный буфер (PER) поверх ReplayBuffer или CompactReplayBuffer.
+    Приоритеты слотов лежат в SumTree; батч выбирается стратифицированно
+    пропорционально priority^alpha и возвращается вместе с весами важности,
+    beta которых линейно растёт до 1 за beta_steps выборок.
+    """
+    def __init__(self, buffer, alpha=0.6, beta_start=0.4, beta_steps=100000, eps=1e-6):
+        self.buffer = buffer
+        self.tree = SumTree(buffer.capacity)
+        self.alpha = alpha
+        self.beta_start = beta_start
+        self.beta_steps = beta_steps
+        self.eps = eps
+        self.max_priority = 1.0
+        self.sample_step = 0
+        # Буфер, открытый с диска, уже содержит переходы: приоритеты не хранятся, даём всем равный
+        if len(buffer):
+            self.tree.update(buffer.transition_slots(), 1.0)
+
+    def __len__(self):
+        return len(self.buffer)
+
+    @property
+    def nbytes(self):
+        return self.buffer.nbytes + self.tree.tree.nbytes
+
+    @property
+    def beta(self):
+        return min(1.0, self.beta_start + (1.0 - self.beta_start) * self.sample_step / self.beta_steps)
+
+    def store(self, state, action, reward, next_state, done):
+        start = self.buffer.pos
+        i = self.buffer.store(state, action, reward, next_state, done)
+        # Все перезаписанные слоты теряют приоритет, новый переход получает максимальный
+        n_written = (self.buffer.pos - start) % self.buffer.capacity or self.buffer.capacity
+        for k in range(n_written):
+            slot = (start + k) % self.buffer.capacity
+            if slot != i:
+                self.tree.set(slot, 0.0)
+        self.tree.set(i, self.max_priority ** self.alpha)
+        return i
+
+    def sample_indices(self, batch_size):
+        # Стратифицированная выборка: по одному значению из каждого из batch_size отрезков
+        segment = self.tree.total() / batch_size
+        values = (np.arange(batch_size) + self.buffer.rng.random(batch_size)) * segment
+        return self.tree.find(np.maximum(values, 1e-12 * segment))
+
+    def gather(self, idx):
+        return self.buffer.gather(idx)
+
+    def sample(self, batch_size):
+        """Возвращает (батч, веса важности, индексы слотов)."""
+        idx = self.sample_indices(batch_size)
+        probs = self.tree.priorities(idx) / self.tree.total()
+        weights = (len(self) * probs) ** -self.beta
+        weights /= weights.max()
+        self.sample_step += 1
+        return self.gather(idx), weights.astype(np.float32), idx
+
+    def state_dict(self):
+        state = {'buffer': self.buffer.state_dict(), 'max_priority': self.max_priority,
+                 'sample_step': self.sample_step}
+        state['priorities'] = self.tree.priorities(np.arange(self.buffer.size))
+        return state
+
+    def load_state_dict(self, state):
+        self.buffer.load_state_dict(state['buffer'])
+        self.max_priority = state['max_priority']
+        self.sample_step = state['sample_step']
+        self.tree = SumTree(self.buffer.capacity)
+        if len(state['priorities']):
+            self.tree.update(np.arange(len(state['priorities'])), state['priorities'])
+
+    def update_priorities(self, idx, td_errors):
+        priorities = np.abs(td_errors) + self.eps
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+        self.tree.update(idx, priorities ** self.alpha)
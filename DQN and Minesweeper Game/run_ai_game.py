@@ -3,16 +3,35 @@
 Скрипт для запуска AI игры в сапёр
 """
 
+import argparse
 import os
 import sys
 from ai_minesweeper import AIMinesweeper
+from board_view import VIEWS
+from inference import read_metadata
+
+DEFAULT_MODELS = ('dqn_policy.pt', 'dqn_weights.pth')
 
 def main():
+    parser = argparse.ArgumentParser(description='Демонстрация игры DQN-агента')
+    parser.add_argument('--model', default=None,
+                        help='артефакт inference.py или контрольная точка (по умолчанию dqn_policy.pt, '
+                             'если он есть, иначе dqn_weights.pth)')
+    parser.add_argument('--rows', type=int, default=None, help='по умолчанию из артефакта или 16')
+    parser.add_argument('--cols', type=int, default=None, help='по умолчанию из артефакта или 16')
+    parser.add_argument('--mines', type=int, default=None, help='по умолчанию из артефакта или 40')
+    parser.add_argument('--view', choices=list(VIEWS), default=None,
+                        help='отрисовка поля: кнопки или один холст (по умолчанию по размеру поля)')
+    parser.add_argument('--hybrid', action='store_true', help='включить решатель с самого начала')
+    args = parser.parse_args()
+    
     print("=== AI Minesweeper - DQN Agent ===")
     print()
     
     # Проверяем наличие модели
-    model_path = 'dqn_weights.pth'
+    model_path = args.model
+    if model_path is None:
+        model_path = next((p for p in DEFAULT_MODELS if os.path.exists(p)), DEFAULT_MODELS[-1])
     if not os.path.exists(model_path):
         print(f"❌ Файл модели {model_path} не найден!")
         print("Сначала обучите агента, запустив:")
@@ -22,18 +41,24 @@ def main():
         return
     
     print(f"✅ Модель найдена: {model_path}")
+    # Размер поля берём из метаданных артефакта, если он не задан явно
+    metadata = read_metadata(model_path) or {}
+    rows = args.rows or metadata.get('rows', 16)
+    cols = args.cols or metadata.get('cols', 16)
+    mines = args.mines or metadata.get('n_mines') or 40
     print()
     print("Управление:")
     print("- 'Автоигра' - запускает автоматическую игру агента")
     print("- 'Один ход' - агент делает один ход")
     print("- 'Новая игра' - начинает новую игру")
+    print("- 'Решатель' - делать ходы, безопасность которых следует из чисел на поле, без сети")
     print("- 'Скорость' - настройка скорости автоигры (в миллисекундах)")
     print()
     print("Запускаю игру...")
     print()
     
     try:
-        game = AIMinesweeper(model_path)
+        game = AIMinesweeper(model_path, args.hybrid, rows, cols, mines, args.view)
         game.start()
     except Exception as e:
         print(f"❌ Ошибка запуска игры: {e}")
@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+"""
+Чтение поля сапёра с экрана: снимок только области поля (mss), сетка клеток находится
+один раз по первому кадру, клетки распознаются сравнением с шаблонами. На каждом
+следующем кадре заново распознаются только клетки, чьи пиксели изменились, а результат
+распознавания одинаковых клеток кэшируется. Выход - наблюдение как у MinesweeperEnv
+(-3 - закрыто, -1 - мина, 0-8 - открыто), по которому агент выбирает клик.
+
+    # шаблоны из снимка поля с известным наблюдением
+    python screen_reader.py learn board.png board_obs.npy --rows 16 --cols 16 --out templates.npz
+    # игра агента на экране
+    python screen_reader.py live --region 100 200 480 480 --rows 16 --cols 16 --mines 40
+    # без экрана: прогон по сохранённым кадрам (frame.png/.npy и, если есть, frame.obs.npy)
+    python screen_reader.py offline fixtures/ --rows 16 --cols 16
+    # проверка читателя на фикстурах из репозитория (ненулевой код при расхождении)
+    python screen_reader.py offline fixtures/screen_reader --templates fixtures/screen_reader/templates.npz
+
+mss, pyautogui и opencv импортируются только там, где нужны: распознавание по
+сохранённым .npy-кадрам работает на одном numpy.
+"""
+
+import argparse
+import glob
+import os
+import time
+
+import numpy as np
+
+from minesweeper_env import CLOSED, MINE, _NO_CELLS
+
+# Значения клеток, которые распознаёт читатель
+CELL_VALUES = (CLOSED, MINE) + tuple(range(9))
+
+
+def _edge_profile(gray, axis):
+    """Сила вертикальных (axis=1) или горизонтальных (axis=0) границ вдоль оси."""
+    return np.abs(np.diff(gray, axis=axis)).sum(axis=1 - axis)
+
+
+def _estimate_pitch(profile, min_pitch=8):
+    """
+    Шаг сетки по автокорреляции профиля границ: первый её пик не ниже половины наибольшего
+    (кратные шагу сдвиги дают почти такие же пики, поэтому наибольший брать нельзя).
+    Дробный шаг уточняется по пикам на удвоенных, учетверённых и т.д. шагах.
+    """
+    profile = profile - profile.mean()
+    corr = np.correlate(profile, profile, mode='full')[len(profile) - 1:][:len(profile) // 2]
+    lags = np.arange(min_pitch, len(corr) - 1)
+    peaks = lags[(corr[lags] >= corr[lags - 1]) & (corr[lags] >= corr[lags + 1])]
+    if not len(peaks):
+        raise ValueError('не удалось найти шаг сетки - задайте rows и cols')
+    pitch = float(peaks[np.argmax(corr[peaks] >= 0.5 * corr[peaks].max())])
+    multiple = 2
+    while multiple * pitch + 4 < len(corr):
+        lo = int(multiple * pitch) - 3
+        pitch = (lo + int(np.argmax(corr[lo:lo + 8]))) / multiple
+        multiple *= 2
+    return pitch
+
+
+def _refine_edges(profile, count, length):
+    """
+    Границы count клеток на отрезке length: каждая внутренняя граница - самый сильный
+    перепад в окрестности равномерной оценки; внешние - края области.
+    """
+    pitch = length / count
+    window = max(1, int(pitch / 4))
+    edges = [0]
+    for j in range(1, count):
+        expected = int(round(j * pitch))
+        lo, hi = max(0, expected - window), min(len(profile), expected + window + 1)
+        edges.append(lo + int(np.argmax(profile[lo:hi])) + 1)
+    edges.append(length)
+    return np.array(edges)
+
+
+class Grid:
+    """
+    Положение клеток в кадре области поля: x_edges (cols + 1) и y_edges (rows + 1) -
+    границы столбцов и строк в пикселях. Для сравнения кадров из каждой клетки берётся
+    samples x samples пикселей внутренней части (без рамки шириной margin клетки).
+    """
+    def __init__(self, x_edges, y_edges, samples=8, margin=0.2):
+        self.x_edges = np.asarray(x_edges)
+        self.y_edges = np.asarray(y_edges)
+        self.rows = len(self.y_edges) - 1
+        self.cols = len(self.x_edges) - 1
+        self.samples = samples
+        self._xs = self._sample_points(self.x_edges, samples, margin)
+        self._ys = self._sample_points(self.y_edges, samples, margin)
+
+    @staticmethod
+    def _sample_points(edges, samples, margin):
+        start, end = edges[:-1], edges[1:]
+        inset = np.maximum(1, np.round((end - start) * margin))
+        t = np.linspace(0.0, 1.0, samples)
+        return np.round(start[:, None] + inset[:, None] + t * (end - start - 1 - 2 * inset)[:, None]).astype(int)
+
+    def sample(self, frame):
+        """Пиксели всех клеток одним индексированием: массив (rows, cols, samples, samples, каналы)."""
+        return frame[self._ys[:, None, :, None], self._xs[None, :, None, :]]
+
+    def cell_center(self, action):
+        """Центр клетки action (плоский индекс) в координатах кадра: (x, y)."""
+        x, y = divmod(int(action), self.cols)
+        return ((self.x_edges[y] + self.x_edges[y + 1]) // 2, (self.y_edges[x] + self.y_edges[x + 1]) // 2)
+
+
+def detect_grid(frame, rows=None, cols=None, samples=8):
+    """
+    Находит сетку клеток в кадре области поля (H, W, каналы). rows/cols - размер поля;
+    если не задан, он оценивается по шагу повторяющихся линий сетки.
+    """
+    gray = np.asarray(frame, dtype=np.float32)
+    if gray.ndim == 3:
+        gray = gray.mean(axis=2)
+    height, width = gray.shape
+    x_profile = _edge_profile(gray, axis=1)
+    y_profile = _edge_profile(gray, axis=0)
+    if cols is None:
+        cols = max(1, int(round(width / _estimate_pitch(x_profile))))
+    if rows is None:
+        rows = max(1, int(round(height / _estimate_pitch(y_profile))))
+    return Grid(_refine_edges(x_profile, cols, width), _refine_edges(y_profile, rows, height), samples)
+
+
+class CellTemplates:
+    """
+    Шаблоны клеток: средние пиксели клетки для каждого значения, собранные по кадрам
+    с известным наблюдением (add). classify сравнивает клетки с шаблонами по средней
+    абсолютной разнице и запоминает ответ для каждого встреченного набора пикселей.
+    """
+    def __init__(self, values=(), features=None, cache_size=4096):
+        self.values = np.asarray(values, dtype=int)
+        self.features = (np.zeros((0, 0), dtype=np.float32) if features is None
+                         else np.asarray(features, dtype=np.float32))
+        self.cache_size = cache_size
+        self._cache = {}
+        self._sums = {}
+
+    def add(self, cell_samples, obs):
+        """Добавляет размеченный кадр: cell_samples из Grid.sample, obs - его наблюдение."""
+        cells = cell_samples.reshape(np.size(obs), -1).astype(np.float64)
+        obs = np.asarray(obs).reshape(-1)
+        for value in np.unique(obs):
+            total, count = self._sums.get(int(value), (0.0, 0))
+            self._sums[int(value)] = (total + cells[obs == value].sum(0), count + np.count_nonzero(obs == value))
+        self.values = np.array(sorted(self._sums), dtype=int)
+        self.features = np.stack([self._sums[v][0] / self._sums[v][1] for v in self.values]).astype(np.float32)
+        self._cache.clear()
+
+    def classify(self, cells, tolerance=40.0):
+        """
+        cells: (n, признаки) пиксели клеток. Возвращает (значения, распознано): клетка,
+        не похожая ни на один шаблон ближе tolerance, считается нераспознанной.
+        """
+        values = np.empty(len(cells), dtype=int)
+        known = np.ones(len(cells), dtype=bool)
+        misses = []
+        for i, cell in enumerate(cells):
+            hit = self._cache.get(cell.tobytes())
+            if hit is None:
+                misses.append(i)
+            else:
+                values[i] = hit
+        if misses:
+            batch = cells[misses].astype(np.float32)
+            distance = np.abs(batch[:, None, :] - self.features[None, :, :]).mean(axis=2)
+            best = distance.argmin(axis=1)
+            ok = distance[np.arange(len(misses)), best] <= tolerance
+            values[misses] = self.values[best]
+            known[misses] = ok
+            if len(self._cache) + len(misses) > self.cache_size:
+                self._cache.clear()
+            for i, value, good in zip(misses, values[misses], ok):
+                if good:
+                    self._cache[cells[i].tobytes()] = int(value)
+        return values, known
+
+    def save(self, path):
+        np.savez_compressed(path, values=self.values, features=self.features)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(data['values'], data['features'])
+
+
+class ScreenReader:
+    """
+    Наблюдение по кадрам области поля. read(frame) распознаёт только клетки, чьи выборочные
+    пиксели отличаются от прошлого кадра, и клетки, не распознанные раньше (например,
+    попавшие на анимацию), - остальные берутся из прошлого наблюдения.
+    """
+    def __init__(self, grid, templates, tolerance=40.0):
+        self.grid = grid
+        self.templates = templates
+        self.tolerance = tolerance
+        self.obs = np.full((grid.rows, grid.cols), CLOSED, dtype=int)
+        self.last_changed = _NO_CELLS  # клетки, значения которых обновил последний read
+        self.unknown = _NO_CELLS       # клетки, которые не удалось распознать
+        self._prev = None
+        self._stale = np.ones(grid.rows * grid.cols, dtype=bool)
+
+    def reset(self):
+        self.obs.fill(CLOSED)
+        self._prev = None
+        self._stale[:] = True
+
+    def read(self, frame):
+        """Возвращает наблюдение (rows, cols) - тот же массив, что self.obs."""
+        cells = self.grid.sample(frame).reshape(self.grid.rows * self.grid.cols, -1)
+        changed = self._stale.copy()
+        if self._prev is not None:
+            changed |= (cells != self._prev).any(axis=1)
+        idx = np.flatnonzero(changed)
+        values, known = self.templates.classify(cells[idx], self.tolerance)
+        updated = idx[known]
+        self.obs.flat[updated] = values[known]
+        if self._prev is None:
+            self._prev = cells.copy()
+        else:
+            self._prev[updated] = cells[updated]
+        self._stale[:] = False
+        self._stale[idx[~known]] = True
+        self.last_changed = updated
+        self.unknown = idx[~known]
+        return self.obs
+
+
+class ScreenCapture:
+    """Снимки прямоугольника экрана region = (left, top, width, height) через mss в RGB."""
+    def __init__(self, region):
+        import mss
+        self.region = dict(zip(('left', 'top', 'width', 'height'), map(int, region)))
+        self._sct = mss.mss()
+
+    def grab(self):
+        shot = np.asarray(self._sct.grab(self.region))
+        return shot[:, :, 2::-1]  # BGRA -> RGB
+
+    def close(self):
+        self._sct.close()
+
+
+def load_frame(path):
+    """Кадр из файла: .npy как есть, остальные форматы через opencv (в RGB)."""
+    if path.endswith('.npy'):
+        return np.load(path)
+    import cv2
+    frame = cv2.imread(path, cv2.IMREAD_COLOR)
+    if frame is None:
+        raise ValueError(f'не удалось прочитать кадр {path}')
+    return frame[:, :, ::-1]
+
+
+def fixture_paths(paths):
+    """Кадры из списка файлов и каталогов (в каталоге - по имени), без файлов *.obs.npy."""
+    frames = []
+    for path in paths:
+        if os.path.isdir(path):
+            frames += sorted(glob.glob(os.path.join(path, '*')))
+        else:
+            frames.append(path)
+    return [p for p in frames if not p.endswith('.obs.npy')
+            and os.path.splitext(p)[1].lower() in ('.npy', '.png', '.bmp', '.jpg', '.jpeg')]
+
+
+def _expected_obs(path):
+    expected = os.path.splitext(path)[0] + '.obs.npy'
+    return np.load(expected) if os.path.exists(expected) else None
+
+
+def run_offline(paths, templates, rows=None, cols=None, tolerance=40.0, verbose=False):
+    """
+    Прогон читателя по сохранённым кадрам одной партии (по порядку). Если рядом с кадром
+    лежит frame.obs.npy, наблюдение сверяется с ним. Возвращает число несовпадений.
+    """
+    frames = fixture_paths(paths)
+    if not frames:
+        raise ValueError('нет кадров для прогона')
+    reader = None
+    mismatches = 0
+    for path in frames:
+        frame = load_frame(path)
+        if reader is None:
+            reader = ScreenReader(detect_grid(frame, rows, cols), templates, tolerance)
+        start = time.perf_counter()
+        obs = reader.read(frame)
+        elapsed = time.perf_counter() - start
+        expected = _expected_obs(path)
+        status = ''
+        if expected is not None:
+            wrong = np.count_nonzero(obs != expected)
+            mismatches += wrong > 0
+            status = 'ok' if wrong == 0 else f'не совпало клеток: {wrong}'
+        print(f"{os.path.basename(path)}: {elapsed * 1000:.2f} мс, распознано заново {len(reader.last_changed)}, "
+              f"не распознано {len(reader.unknown)} {status}")
+        if verbose:
+            print(obs)
+    return mismatches
+
+
+def load_agent(path, rows, cols):
+    """Политика для выбора кликов: артефакт inference.py или контрольная точка обучения."""
+    from inference import is_artifact, load_policy
+    if is_artifact(path):
+        return load_policy(path)
+    from dqn_agent import DQNAgent
+    agent = DQNAgent((rows, cols), rows * cols, buffer_size=1, epsilon_start=0.0, device='cpu')
+    agent.load(path)
+    agent.epsilon = 0.0
+    return agent
+
+
+def play_live(agent, region, templates, rows, cols, n_mines=None, hybrid=False, delay=0.3, max_moves=None,
+              record_dir=None, tolerance=40.0, max_wait=20):
+    """
+    Агент играет в сапёр на экране: снимок области region, наблюдение, клик pyautogui по
+    выбранной клетке - пока на поле не появится мина или не останется закрытых клеток.
+    record_dir: сохранять кадры и наблюдения как фикстуры для offline; max_wait: сколько
+    кадров подряд ждать, пока нераспознанные клетки не примут знакомый вид.
+    """
+    import pyautogui
+    capture = ScreenCapture(region)
+    try:
+        frame = capture.grab()
+        reader = ScreenReader(detect_grid(frame, rows, cols), templates, tolerance)
+        moves = 0
+        waited = 0
+        while max_moves is None or moves < max_moves:
+            start = time.perf_counter()
+            obs = reader.read(frame)
+            read_ms = (time.perf_counter() - start) * 1000
+            if record_dir is not None:
+                os.makedirs(record_dir, exist_ok=True)
+                np.save(os.path.join(record_dir, f'frame_{moves:04d}.npy'), frame)
+                np.save(os.path.join(record_dir, f'frame_{moves:04d}.obs.npy'), obs)
+            if (obs == MINE).any() or not (obs == CLOSED).any():
+                print('Партия окончена')
+                break
+            if len(reader.unknown):
+                # Клетки ещё меняются (анимация) - ждём следующий кадр
+                waited += 1
+                if waited > max_wait:
+                    raise RuntimeError(f'не распознаются клетки {reader.unknown.tolist()} - '
+                                       f'нужны шаблоны для них (learn) или больший --tolerance')
+                time.sleep(delay)
+                frame = capture.grab()
+                continue
+            if hybrid:
+                action, _ = agent.select_action_hybrid(obs, n_mines)
+            else:
+                action = agent.select_action(obs.astype(np.float32) / 8.0, obs.reshape(-1) == CLOSED)
+            waited = 0
+            x, y = reader.grid.cell_center(action)
+            print(f"Ход {moves}: клетка {divmod(action, cols)}, чтение кадра {read_ms:.2f} мс")
+            pyautogui.click(region[0] + x, region[1] + y)
+            moves += 1
+            time.sleep(delay)
+            frame = capture.grab()
+    finally:
+        capture.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Чтение поля сапёра с экрана')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def board_args(cmd, required=False):
+        cmd.add_argument('--rows', type=int, default=None, required=required,
+                         help='строк поля (по умолчанию по сетке на кадре)')
+        cmd.add_argument('--cols', type=int, default=None, required=required,
+                         help='столбцов поля (по умолчанию по сетке на кадре)')
+        cmd.add_argument('--tolerance', type=float, default=40.0,
+                         help='наибольшая средняя разница пикселей с шаблоном')
+
+    learn_cmd = commands.add_parser('learn', help='собрать шаблоны по кадрам с известным наблюдением')
+    learn_cmd.add_argument('pairs', nargs='+', help='пары: кадр наблюдение.npy')
+    learn_cmd.add_argument('--out', default='templates.npz')
+    board_args(learn_cmd)
+
+    live_cmd = commands.add_parser('live', help='игра агента на экране')
+    live_cmd.add_argument('--region', type=int, nargs=4, required=True, metavar=('LEFT', 'TOP', 'WIDTH', 'HEIGHT'),
+                          help='прямоугольник поля на экране')
+    live_cmd.add_argument('--model', default='dqn_policy.pt', help='артефакт или контрольная точка')
+    live_cmd.add_argument('--templates', default='templates.npz')
+    live_cmd.add_argument('--mines', type=int, default=None, help='число мин (для решателя)')
+    live_cmd.add_argument('--hybrid', action='store_true', help='ходы решателя, где они выводятся из чисел')
+    live_cmd.add_argument('--delay', type=float, default=0.3, help='секунд между кликом и снимком')
+    live_cmd.add_argument('--max-moves', type=int, default=None)
+    live_cmd.add_argument('--record', default=None, help='каталог для кадров-фикстур')
+    board_args(live_cmd, required=True)
+
+    offline_cmd = commands.add_parser('offline', help='прогон по сохранённым кадрам без экрана')
+    offline_cmd.add_argument('frames', nargs='+', help='кадры или каталоги с кадрами')
+    offline_cmd.add_argument('--templates', default='templates.npz')
+    offline_cmd.add_argument('--verbose', action='store_true', help='печатать наблюдения')
+    board_args(offline_cmd)
+    args = parser.parse_args()
+
+    if args.command == 'learn':
+        if len(args.pairs) % 2:
+            parser.error('learn ожидает пары: кадр наблюдение.npy')
+        templates = CellTemplates()
+        for frame_path, obs_path in zip(args.pairs[::2], args.pairs[1::2]):
+            frame, obs = load_frame(frame_path), np.load(obs_path)
+            grid = detect_grid(frame, args.rows or obs.shape[0], args.cols or obs.shape[1])
+            templates.add(grid.sample(frame), obs)
+        templates.save(args.out)
+        print(f"Шаблоны для значений {templates.values.tolist()} сохранены в {args.out}")
+        missing = sorted(set(CELL_VALUES) - set(templates.values.tolist()))
+        if missing:
+            print(f"Нет примеров для значений {missing}: такие клетки не будут распознаны")
+    elif args.command == 'live':
+        agent = load_agent(args.model, args.rows, args.cols)
+        play_live(agent, args.region, CellTemplates.load(args.templates), args.rows, args.cols, args.mines,
+                  args.hybrid, args.delay, args.max_moves, args.record, args.tolerance)
+    else:
+        mismatches = run_offline(args.frames, CellTemplates.load(args.templates), args.rows, args.cols,
+                                 args.tolerance, args.verbose)
+        if mismatches:
+            raise SystemExit(f"Кадров с расхождениями: {mismatches}")
+
+
+if __name__ == '__main__':
+    main()
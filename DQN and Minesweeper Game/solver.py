@@ -0,0 +1,270 @@
+"""
+Логический решатель сапёра по наблюдению среды (-3 - закрыто, -1 - мина, 0-8 - открыто).
+
+solve(obs, n_mines) находит клетки, безопасность или минность которых следует из чисел
+на поле, и вероятности мин для остальных закрытых клеток:
+  1. простые правила для каждого числа (все мины вокруг уже найдены / все закрытые соседи - мины),
+     векторно по всему полю;
+  2. правило подмножеств: если закрытые соседи числа A входят в соседей числа B,
+     то в разности ровно rem(B) - rem(A) мин;
+  3. перебор расстановок мин отдельно для каждой связной части границы (закрытых клеток
+     рядом с числами) и объединение частей с учётом общего числа мин на поле.
+"""
+
+from math import comb
+
+import numpy as np
+
+from minesweeper_env import CLOSED, MINE, _neighbour_counts, _neighbour_lists
+
+
+def _propagate(obs, numbers, mines, safe):
+    """Простые правила до неподвижной точки; mines и safe дополняются на месте."""
+    closed = obs == CLOSED
+    while True:
+        unknown = closed & ~mines & ~safe
+        n_unknown = _neighbour_counts(unknown)
+        rem = obs - _neighbour_counts(mines)
+        active = numbers & (n_unknown > 0)
+        new_safe = unknown & (_neighbour_counts(active & (rem == 0)) > 0)
+        new_mines = unknown & (_neighbour_counts(active & (rem == n_unknown)) > 0)
+        if not new_safe.any() and not new_mines.any():
+            return unknown, active, rem
+        safe |= new_safe
+        mines |= new_mines
+
+
+def _constraints(unknown, active, rem):
+    """Ограничения чисел границы: {битовая маска неизвестных соседей: сколько среди них мин}."""
+    neighbours = _neighbour_lists(*unknown.shape)
+    unknown_flat = unknown.reshape(-1)
+    constraints = {}
+    for cell in np.flatnonzero(active):
+        mask = 0
+        for n in neighbours[cell]:
+            if unknown_flat[n]:
+                mask |= 1 << n
+        constraints[mask] = int(rem.flat[cell])
+    return constraints
+
+
+def _bits(mask):
+    cells = []
+    while mask:
+        low = mask & -mask
+        cells.append(low.bit_length() - 1)
+        mask ^= low
+    return cells
+
+
+def _subset_rule(constraints):
+    """Правило подмножеств; возвращает (маска безопасных, маска мин)."""
+    safe = mines = 0
+    items = list(constraints.items())
+    by_cell = {}
+    for i, (mask, _) in enumerate(items):
+        for cell in _bits(mask):
+            by_cell.setdefault(cell, []).append(i)
+    for i, (a, rem_a) in enumerate(items):
+        # Надмножества A пересекаются с A - достаточно кандидатов по одной его клетке
+        for j in by_cell[(a & -a).bit_length() - 1]:
+            b, rem_b = items[j]
+            if i == j or a & ~b:
+                continue
+            diff = b & ~a
+            extra = rem_b - rem_a
+            if extra == 0:
+                safe |= diff
+            elif extra == bin(diff).count('1'):
+                mines |= diff
+    return safe, mines
+
+
+def _components(constraints):
+    """Разбивает ограничения на независимые части (по общим клеткам): список (клетки, ограничения)."""
+    parts = []
+    for mask, rem in constraints.items():
+        merged_mask, merged = mask, [(mask, rem)]
+        rest = []
+        for part_mask, part in parts:
+            if part_mask & merged_mask:
+                merged_mask |= part_mask
+                merged += part
+            else:
+                rest.append((part_mask, part))
+        parts = rest + [(merged_mask, merged)]
+    return [(_bits(mask), part) for mask, part in parts]
+
+
+def _enumerate(cells, constraints):
+    """
+    Перебор с отсечениями всех расстановок мин в cells, согласных с ограничениями.
+    Возвращает (counts, cell_counts): число расстановок с k минами и, для каждого k,
+    сколько из них ставят мину в каждую клетку.
+    """
+    n = len(cells)
+    index = {cell: i for i, cell in enumerate(cells)}
+    cell_cons = [[] for _ in range(n)]
+    need, left = [], []
+    for c, (mask, rem) in enumerate(constraints):
+        members = _bits(mask)
+        for cell in members:
+            cell_cons[index[cell]].append(c)
+        need.append(rem)
+        left.append(len(members))
+    counts = np.zeros(n + 1, dtype=np.int64)
+    cell_counts = np.zeros((n + 1, n), dtype=np.int64)
+    assign = np.zeros(n, dtype=np.int64)
+
+    def rec(i, k):
+        if i == n:
+            counts[k] += 1
+            cell_counts[k] += assign
+            return
+        for value in (0, 1):
+            ok = True
+            for c in cell_cons[i]:
+                need[c] -= value
+                left[c] -= 1
+                if need[c] < 0 or need[c] > left[c]:
+                    ok = False
+            if ok:
+                assign[i] = value
+                rec(i + 1, k + value)
+            for c in cell_cons[i]:
+                need[c] += value
+                left[c] += 1
+        assign[i] = 0
+
+    rec(0, 0)
+    return counts, cell_counts
+
+
+def _convolve(a, b):
+    out = [0] * (len(a) + len(b) - 1)
+    for i, x in enumerate(a):
+        if x:
+            for j, y in enumerate(b):
+                out[i + j] += x * y
+    return out
+
+
+def solve(obs, n_mines=None, probabilities=True, max_component=40):
+    """
+    obs: наблюдение (rows, cols); n_mines: число мин на поле (без него вероятности
+    считаются без учёта общего числа мин, а для клеток вдали от чисел не определены).
+    Возвращает (safe, mines, probs): маски закрытых клеток, которые наверняка безопасны и
+    наверняка мины, и вероятности мины для закрытых клеток (NaN для открытых). При
+    probabilities=False перебор не выполняется и probs = None. Части границы больше
+    max_component клеток не перебираются - их вероятности оцениваются по соседним числам.
+    """
+    obs = np.asarray(obs)
+    rows, cols = obs.shape
+    closed = obs == CLOSED
+    numbers = obs >= 0
+    mines = obs == MINE
+    safe = np.zeros_like(closed)
+    while True:
+        unknown, active, rem = _propagate(obs, numbers, mines, safe)
+        constraints = _constraints(unknown, active, rem)
+        safe_bits, mine_bits = _subset_rule(constraints)
+        if not safe_bits and not mine_bits:
+            break
+        safe.flat[_bits(safe_bits)] = True
+        mines.flat[_bits(mine_bits)] = True
+    mines &= closed
+    if not probabilities:
+        return safe, mines, None
+
+    probs = np.full((rows, cols), np.nan)
+    probs[closed] = 0.0
+    probs[mines] = 1.0
+    unknown_flat = unknown.reshape(-1)
+    frontier = np.zeros(rows * cols, dtype=bool)
+    exact = []
+    approx_mines = 0.0
+    for cells, part in _components(constraints):
+        frontier[cells] = True
+        if len(cells) <= max_component:
+            counts, cell_counts = _enumerate(cells, part)
+            exact.append((cells, counts.tolist(), cell_counts))
+        else:
+            # Оценка: средняя по соседним числам доля мин среди их неизвестных соседей
+            density = np.zeros(rows * cols)
+            hits = np.zeros(rows * cols)
+            for mask, rem_c in part:
+                members = _bits(mask)
+                density[members] += rem_c / len(members)
+                hits[members] += 1
+            probs.flat[cells] = density[cells] / hits[cells]
+            approx_mines += probs.flat[cells].sum()
+
+    interior = np.flatnonzero(unknown_flat & ~frontier)
+    left_mines = None
+    if n_mines is not None:
+        left_mines = n_mines - int(mines.sum()) - int(round(approx_mines))
+
+    def weights(counts_list, rest):
+        # Вес расстановки с k минами в части: сколько расстановок остальных частей и внутренних клеток
+        dist = _convolve(counts_list, rest)
+        if left_mines is None:
+            return [sum(rest)] * len(counts_list), sum(counts_list) * sum(rest)
+        total = sum(c * comb(len(interior), left_mines - k) for k, c in enumerate(dist)
+                    if 0 <= left_mines - k)
+        w = [sum(r * comb(len(interior), left_mines - k - j) for j, r in enumerate(rest)
+                 if 0 <= left_mines - k - j)
+             for k in range(len(counts_list))]
+        return w, total
+
+    all_counts = [1]
+    for _, counts, _ in exact:
+        all_counts = _convolve(all_counts, counts)
+    if left_mines is not None and not any(c and 0 <= left_mines - k <= len(interior)
+                                          for k, c in enumerate(all_counts)):
+        left_mines = None  # число мин не согласуется с полем - считаем без него
+
+    for i, (cells, counts, cell_counts) in enumerate(exact):
+        rest = [1]
+        for j, (_, other, _) in enumerate(exact):
+            if j != i:
+                rest = _convolve(rest, other)
+        w, total = weights(counts, rest)
+        numerators = np.array(w, dtype=object) @ cell_counts.astype(object)
+        for cell, numerator in zip(cells, numerators):
+            probs.flat[cell] = numerator / total
+            if numerator == 0:
+                safe.flat[cell] = True
+            elif numerator == total:
+                mines.flat[cell] = True
+
+    if len(interior):
+        if left_mines is None:
+            probs.flat[interior] = np.nan
+        else:
+            total = sum(c * comb(len(interior), left_mines - k) for k, c in enumerate(all_counts)
+                        if 0 <= left_mines - k)
+            expected = sum(c * comb(len(interior), left_mines - k) * (left_mines - k)
+                           for k, c in enumerate(all_counts) if 0 <= left_mines - k)
+            probs.flat[interior] = expected / total / len(interior)
+            if expected == 0:
+                safe.flat[interior] = True
+            elif expected == total * len(interior):
+                mines.flat[interior] = True
+    return safe, mines, probs
+
+
+def hybrid_action(obs, n_mines, network_action):
+    """
+    Ход по сырому наблюдению: клетка, безопасность которой следует из чисел на поле, а если
+    такой нет - network_action(нормализованное наблюдение, маска) среди закрытых клеток,
+    кроме найденных мин. Возвращает (действие, True если ход сделал решатель).
+    """
+    safe, mines, _ = solve(obs, n_mines, probabilities=False)
+    if not safe.any():
+        # Перебор расстановок находит и те безопасные клетки, что не видны простым правилам
+        safe, mines, _ = solve(obs, n_mines)
+    if safe.any():
+        return int(np.flatnonzero(safe)[0]), True
+    closed = np.asarray(obs).reshape(-1) == CLOSED
+    mask = closed & ~mines.reshape(-1)
+    return network_action(np.asarray(obs, dtype=np.float32) / 8.0, mask if mask.any() else closed), False
@@ -1,6 +1,9 @@
 import numpy as np
 from minesweeper_env import MinesweeperEnv
 from dqn_agent import DQNAgent
+from metrics import PhaseTimer, MetricsLogger
+from checkpoint import CheckpointWriter
+import argparse
 import os
 import time
 
@@ -9,60 +12,185 @@ EPISODES = 10000
 SAVE_EVERY = 500
 MODEL_PATH = 'dqn_weights.pth'
 VISUALIZE_EVERY = 500  # как часто показывать игру агента
+PRIORITIZED_REPLAY = False  # выборка опыта по TD-ошибке (PER)
+MAX_STEPS = 300  # ограничение длины эпизода
+ARCH = 'dense'  # 'conv' - полностью свёрточная сеть, работает на поле любого размера
+AUGMENT = False  # случайные повороты/отражения поля в батчах обучения
+LOG_EVERY = 10  # как часто (в эпизодах) писать запись в журнал метрик
+KEEP_CHECKPOINTS = 3  # сколько последних пронумерованных контрольных точек хранить
+REPLAY_DIR = None  # каталог для буфера опыта в файлах на диске (None - в памяти)
+DOUBLE_DQN = False  # Double DQN: следующее действие выбирает q_network, оценивает target-сеть
+N_STEP = 1  # длина возвратов в целях обучения (1 - обычный одношаговый DQN)
+TAU = None  # мягкое обновление target-сети на каждом шаге; None - копирование раз в 1000 шагов
 
-# Создаём среду и агента
-env = MinesweeperEnv()
-state_shape = env.observation_space
-n_actions = env.action_space
-agent = DQNAgent(state_shape, n_actions)
-
-# Если есть сохранённая модель — загружаем
-if os.path.exists(MODEL_PATH):
-    print('Загружаю сохранённую модель...')
-    agent.load(MODEL_PATH)
-
-for episode in range(1, EPISODES + 1):
-    state = env.reset()
-    done = False
-    total_reward = 0
-    steps = 0
-    while not done:
-        # Преобразуем состояние для агента
-        state_input = state.astype(np.float32) / 8.0  # нормализация
-        action = agent.select_action(state_input)
-        next_state, reward, done, info = env.step(action)
-        next_state_input = next_state.astype(np.float32) / 8.0
-        agent.store(state_input, action, reward, next_state_input, done)
-        agent.update()
-        state = next_state
-        total_reward += reward
-        steps += 1
-    # Лог
-    print(f"Эпизод {episode}: шагов {steps}, награда {total_reward:.2f}, epsilon {agent.epsilon:.3f}")
-    if episode % SAVE_EVERY == 0:
-        agent.save(MODEL_PATH)
-        print(f"Модель сохранена в {MODEL_PATH}")
-    # Визуализация игры агента
-    if episode % VISUALIZE_EVERY == 0:
-        print("\nВизуализация: агент играет одну партию...")
-        vis_env = MinesweeperEnv()
-        vis_state = vis_env.reset()
-        vis_done = False
-        vis_steps = 0
-        while not vis_done:
+
+def create_agent(env, resume=False, replay_dir=REPLAY_DIR, double=DOUBLE_DQN, n_step=N_STEP, tau=TAU):
+    """
+    Создаёт агента под среду и загружает сохранённую модель, если она есть.
+    resume=True продолжает обучение: восстанавливаются и буфер опыта, и счётчики, и ГСЧ.
+    Буфер в replay_dir открывается со своим содержимым и без resume.
+    double, n_step, tau - варианты целей обучения (см. DQNAgent).
+    """
+    agent = DQNAgent(env.observation_space, env.action_space, compact_replay=True, prioritized=PRIORITIZED_REPLAY,
+                     arch=ARCH, augment=AUGMENT, replay_dir=replay_dir, double=double, n_step=n_step, tau=tau)
+    if os.path.exists(MODEL_PATH):
+        print('Продолжаю обучение с сохранённой точки...' if resume else 'Загружаю сохранённую модель...')
+        agent.load(MODEL_PATH, resume=resume)
+    return agent
+
+
+def save_checkpoint(writer, agent):
+    """Снимает состояние агента и отдаёт его на запись в фоне; точки нумеруются по learn_step."""
+    writer.save(agent.checkpoint_state(full=True), agent.learn_step)
+
+
+def train(episodes=EPISODES, metrics_path=None, log_every=LOG_EVERY, resume=False, replay_dir=REPLAY_DIR,
+          double=DOUBLE_DQN, n_step=N_STEP, tau=TAU):
+    """
+    Обучение в одном процессе: ход в среде и шаг обучения по очереди.
+    metrics_path: журнал метрик (.jsonl или .csv) со временем по фазам цикла,
+    скоростями, loss и долей побед; без него фазы не замеряются.
+    Контрольные точки пишутся в фоновом потоке (см. CheckpointWriter).
+    """
+    env = MinesweeperEnv(max_steps=MAX_STEPS)
+    state_shape = env.observation_space
+    agent = create_agent(env, resume, replay_dir, double, n_step, tau)
+    writer = CheckpointWriter(MODEL_PATH, KEEP_CHECKPOINTS)
+    timer = PhaseTimer(enabled=metrics_path is not None)
+    logger = MetricsLogger(metrics_path) if metrics_path else None
+    if logger:
+        agent.timer = timer
+    start = time.time()
+    env_steps = 0
+    interval = {'time': start, 'env_steps': 0, 'updates': agent.learn_step, 'episodes': 0, 'wins': 0, 'steps': 0}
+
+    # Буферы наблюдений: среда пишет в них сырые коды клеток, буфер опыта копирует их в int8
+    obs = np.empty(state_shape, dtype=np.int8)
+    next_obs = np.empty(state_shape, dtype=np.int8)
+    state_input = np.empty(state_shape, dtype=np.float32)
+
+    for episode in range(1, episodes + 1):
+        env.reset(out=obs)
+        timer.mark()
+        done = False
+        total_reward = 0
+        steps = 0
+        while not done:
+            np.multiply(obs, 1 / 8.0, out=state_input)  # нормализация
+            action = agent.select_action(state_input, env.legal_mask())
+            timer.lap('act')
+            _, reward, done, info = env.step(action, out=next_obs)
+            timer.lap('env')
+            # Обрыв по MAX_STEPS - не конец игры, ценность следующего состояния учитывается
+            agent.store(obs, action, reward, next_obs, done and not info.get('truncated', False))
+            timer.lap('store')
+            agent.update()
+            obs, next_obs = next_obs, obs
+            total_reward += reward
+            steps += 1
+        # Лог
+        print(f"Эпизод {episode}: шагов {steps}, награда {total_reward:.2f}, epsilon {agent.epsilon:.3f}")
+        env_steps += steps
+        if logger:
+            interval['episodes'] += 1
+            interval['wins'] += 'win' in info
+            interval['steps'] += steps
+            if episode % log_every == 0:
+                log_metrics(logger, agent, timer, interval, episode, env_steps, start)
+        if episode % SAVE_EVERY == 0:
+            timer.mark()
+            save_checkpoint(writer, agent)
+            timer.lap('checkpoint')
+            print(f"Контрольная точка {agent.learn_step} передана на запись в {MODEL_PATH}")
+        # Визуализация игры агента
+        if episode % VISUALIZE_EVERY == 0:
+            print("\nВизуализация: агент играет одну партию...")
+            vis_env = MinesweeperEnv(max_steps=MAX_STEPS)
+            vis_state = vis_env.reset()
+            vis_done = False
+            vis_steps = 0
+            while not vis_done:
+                vis_env.render()
+                vis_state_input = vis_state.astype(np.float32) / 8.0
+                vis_action = agent.select_action(vis_state_input, vis_env.legal_mask())
+                vis_state, vis_reward, vis_done, vis_info = vis_env.step(vis_action)
+                vis_steps += 1
+                time.sleep(0.1)  # задержка для наглядности
             vis_env.render()
-            vis_state_input = vis_state.astype(np.float32) / 8.0
-            vis_action = agent.select_action(vis_state_input)
-            vis_state, vis_reward, vis_done, vis_info = vis_env.step(vis_action)
-            vis_steps += 1
-            time.sleep(0.1)  # задержка для наглядности
-        vis_env.render()
-        if 'win' in vis_info:
-            print(f'Агент победил за {vis_steps} ходов!')
-        elif 'lose' in vis_info:
-            print(f'Агент проиграл за {vis_steps} ходов!')
-        print("---\n")
-
-# Финальное сохранение
-agent.save(MODEL_PATH)
-print('Обучение завершено, модель сохранена!')
\ No newline at end of file
+            if 'win' in vis_info:
+                print(f'Агент победил за {vis_steps} ходов!')
+            elif 'lose' in vis_info:
+                print(f'Агент проиграл за {vis_steps} ходов!')
+            print("---\n")
+
+    # Финальное сохранение
+    save_checkpoint(writer, agent)
+    writer.close()
+    print('Обучение завершено, модель сохранена!')
+    if logger:
+        logger.close()
+
+
+def log_metrics(logger, agent, timer, interval, episode, env_steps, start):
+    """Пишет запись журнала за интервал с прошлой записи и начинает новый интервал."""
+    now = time.time()
+    elapsed = max(now - interval['time'], 1e-9)
+    record = {
+        'elapsed': now - start,
+        'episode': episode,
+        'env_steps': env_steps,
+        'updates': agent.learn_step,
+        'env_steps_per_sec': (env_steps - interval['env_steps']) / elapsed,
+        'updates_per_sec': (agent.learn_step - interval['updates']) / elapsed,
+        'replay_size': len(agent.memory),
+        'replay_bytes': agent.memory.nbytes,
+        'loss': None if agent.last_loss is None else float(agent.last_loss),
+        'mean_q': None if agent.last_q is None else float(agent.last_q),
+        'epsilon': agent.epsilon,
+        'episode_length': interval['steps'] / max(interval['episodes'], 1),
+        'win_rate': interval['wins'] / max(interval['episodes'], 1),
+    }
+    record.update({f'time_{phase}': seconds for phase, seconds in timer.totals.items()})
+    logger.log(record)
+    interval.update(time=now, env_steps=env_steps, updates=agent.learn_step, episodes=0, wins=0, steps=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Обучение DQN-агента для сапёра')
+    parser.add_argument('--actors', type=int, default=0,
+                        help='число процессов-акторов; 0 - обучение в одном процессе')
+    parser.add_argument('--episodes', type=int, default=EPISODES, help='число эпизодов обучения')
+    parser.add_argument('--metrics', default=None,
+                        help='журнал метрик (.jsonl или .csv); отчёт: python metrics.py <файл>')
+    parser.add_argument('--log-every', type=int, default=LOG_EVERY, help='эпизодов на запись журнала')
+    parser.add_argument('--resume', action='store_true',
+                        help='продолжить обучение из MODEL_PATH вместе с буфером опыта и состоянием ГСЧ')
+    parser.add_argument('--replay-dir', default=REPLAY_DIR,
+                        help='хранить буфер опыта в файлах этого каталога (больше ОЗУ, переживает перезапуск)')
+    parser.add_argument('--double', action='store_true', default=DOUBLE_DQN, help='Double DQN')
+    parser.add_argument('--n-step', type=int, default=N_STEP, help='длина возвратов в целях обучения')
+    parser.add_argument('--tau', type=float, default=TAU,
+                        help='мягкое обновление target-сети с этим коэффициентом (например, 0.005)')
+    args = parser.parse_args()
+    if args.actors > 0:
+        from distributed import train_distributed
+        env_kwargs = {'max_steps': MAX_STEPS}
+        agent = create_agent(MinesweeperEnv(**env_kwargs), args.resume, args.replay_dir, args.double, args.n_step,
+                             args.tau)
+        writer = CheckpointWriter(MODEL_PATH, KEEP_CHECKPOINTS)
+        logger = MetricsLogger(args.metrics) if args.metrics else None
+        train_distributed(agent, args.actors, args.episodes, env_kwargs=env_kwargs,
+                          save_every=SAVE_EVERY, save_checkpoint=lambda: save_checkpoint(writer, agent),
+                          logger=logger, log_every=args.log_every)
+        save_checkpoint(writer, agent)
+        writer.close()
+        print('Обучение завершено, модель сохранена!')
+        if logger:
+            logger.close()
+    else:
+        train(args.episodes, args.metrics, args.log_every, args.resume, args.replay_dir, args.double, args.n_step,
+              args.tau)
+
+
+if __name__ == '__main__':
+    main()